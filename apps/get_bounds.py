@@ -5,6 +5,7 @@ import pandas as pd
 import streamlit as st
 import leafmap.foliumap as leafmap
 from streamlit_folium import st_folium
+from reverse_geocoder import describe, reverse_geocode
 
 
 def app():
@@ -22,6 +23,15 @@ def app():
             center = m.st_map_center(output)
             st.text_input('Map Center Latitude', center[0])
             st.text_input('Map center Longitude', center[1])
+            # Nearest place from the local index, no network call
+            nearest = reverse_geocode(center[0], center[1])
+            if nearest:
+                st.text_input('Nearest place', describe(nearest))
+            clicked = output.get('last_clicked')
+            if clicked:
+                nearest = reverse_geocode(clicked['lat'], clicked['lng'])
+                if nearest:
+                    st.text_input('Clicked place', describe(nearest))
             st.write(output)
         except:
             pass
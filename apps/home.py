@@ -1,12 +1,23 @@
 import streamlit as st
 import leafmap.foliumap as leafmap
-from geopy.geocoders import Nominatim
 import requests
 import folium
-import polyline
-import tempfile
+import asyncio
+import hashlib
 import os
-from audio_to_text import process_audio
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from model_server import process_audio, latency_summary, ModelServerBusy
+from inference_queue import SchedulerBusy
+from command_executor import StepFailed, get_executor
+from latency import span, recorder
+from geocoding import geocode
+from offline_router import get_router
+from route_geometry import decode_polyline, get_india_boundary, route_bounds
+from reverse_geocoder import describe, reverse_geocode
+from apps.osm_names import place_typeahead
 from audio_recorder_streamlit import audio_recorder
 
 # India geographical constraints
@@ -17,229 +28,307 @@ INDIA_BOUNDS = {
     "max_lon": 97.25
 }
 
+# Seconds to wait for the model server to turn a recording into a command
+VOICE_TIMEOUT = 60
+
+# Fallback when no offline road graph has been built (see offline_router.py)
+OSRM_URL = os.environ.get("OSRM_URL", "http://router.project-osrm.org")
+OSRM_TIMEOUT = (2, 10)
+
+OVERPASS_URL = 'http://overpass-api.de/api/interpreter'
+ROAD_LAYER_QUERY = """
+    [out:json];
+    way["highway"~"motorway|trunk|primary|secondary|tertiary"](8.4,68.7,37.6,97.3);
+    out geom;
+"""
+NH_QUERY = """
+    [out:json];
+    way["ref"="NH{nh_num}"](8.4,68.7,37.6,97.3);
+    out geom;
+"""
+
+# Deadlines (seconds) for the network steps of a command
+GEOCODE_DEADLINE = 10
+ROUTE_DEADLINE = 20
+OVERPASS_TIMEOUT = 30
+# How often the progress of a running command is refreshed
+PROGRESS_INTERVAL = 0.5
+
+# Reruns triggered inside a fragment only re-execute that function
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", lambda f: f)
+HAS_FRAGMENTS = hasattr(st, "fragment") or hasattr(st, "experimental_fragment")
+
+def within_india(lats, lons):
+    """Which points are in India: the boundary polygon if available, else INDIA_BOUNDS"""
+    boundary = get_india_boundary()
+    if boundary is not None:
+        return boundary.contains(lats, lons)
+    lats, lons = np.asarray(lats), np.asarray(lons)
+    return ((INDIA_BOUNDS["min_lat"] <= lats) & (lats <= INDIA_BOUNDS["max_lat"]) &
+            (INDIA_BOUNDS["min_lon"] <= lons) & (lons <= INDIA_BOUNDS["max_lon"]))
+
 def is_within_india(lat, lon):
     """Check if coordinates are within India's boundaries"""
-    return (INDIA_BOUNDS["min_lat"] <= lat <= INDIA_BOUNDS["max_lat"] and
-            INDIA_BOUNDS["min_lon"] <= lon <= INDIA_BOUNDS["max_lon"])
+    return bool(within_india([lat], [lon])[0])
 
-def get_route(start_coords, end_coords):
-    """Get driving route coordinates and distance using OSRM API"""
-    try:
-        url = f"http://router.project-osrm.org/route/v1/driving/{start_coords[1]},{start_coords[0]};{end_coords[1]},{end_coords[0]}?overview=full"
-        response = requests.get(url)
-        data = response.json()
+# Pooled HTTP connections to OSRM and Overpass, shared with the command executor's threads
+http = requests.Session()
 
-        if data.get('code') == 'Ok' and data.get('routes'):
-            route_coords = polyline.decode(data['routes'][0]['geometry'])
-            distance = data['routes'][0]['distance']  # in meters
-            
-            # Check if all route points are within India
-            if not all(is_within_india(p[0], p[1]) for p in route_coords):
-                return None, None
-                
-            return route_coords, distance
+def osrm_route(start_coords, end_coords):
+    """Route from the OSRM HTTP API"""
+    url = f"{OSRM_URL}/route/v1/driving/{start_coords[1]},{start_coords[0]};{end_coords[1]},{end_coords[0]}"
+    response = http.get(url, params={"overview": "full"}, timeout=OSRM_TIMEOUT)
+    data = response.json()
+    if data.get('code') == 'Ok' and data.get('routes'):
+        return decode_polyline(data['routes'][0]['geometry']), data['routes'][0]['distance']
+    return None, None
+
+def get_route(start_coords, end_coords):
+    """Get driving route coordinates ((n, 2) array) and distance (meters), offline if a road graph is built"""
+    router = get_router()
+    if router is not None:
+        with span("routing.offline"):
+            route_coords, distance = router.route(start_coords, end_coords)
+    else:
+        with span("routing"):
+            route_coords, distance = osrm_route(start_coords, end_coords)
+    if route_coords is None or not len(route_coords):
         return None, None
-    except Exception as e:
-        st.error(f"Routing error: {str(e)}")
+
+    # Check if all route points are within India
+    if not within_india(route_coords[:, 0], route_coords[:, 1]).all():
         return None, None
 
-def app():
-    st.title("Geospatial Command Processor")
-    
-    # Initialize session state
-    session_defaults = {
-        "zoom": 4,
-        "center": [20.5937, 78.9629],  # Default center (India)
-        "basemap": "ROADMAP",
-        "markers": [],
-        "route": None,
-        "distance": None,
-        "bounds": None,
-        "road_layer": None,
-        "nh_layer": None,
-        "nh_number": None
-    }
-    for key, val in session_defaults.items():
-        if key not in st.session_state:
-            st.session_state[key] = val
-            
-    # Voice input section
-    st.subheader("Voice Commands")
-    audio_bytes = audio_recorder(text="Click to record command", pause_threshold=2.0)
-    
-    command = None
-    
-    if audio_bytes:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as fp:
-            fp.write(audio_bytes)
-            temp_path = fp.name
-        
-        with st.spinner("Processing voice command..."):
-            try:
-                command = process_audio(temp_path)
-                print(command)
-                st.session_state.command = command
-                st.success(f"Detected command: {command}")
-            except Exception as e:
-                st.error(f"Error processing audio: {str(e)}")
-        
-        os.unlink(temp_path)
+    return route_coords, distance
 
-    # Input box for preprocessed command
-    # command = st.text_input("Enter command (e.g., 'Jaipur', 'Road Layer', 'NH32'):")
+def latency_table(summary):
+    """Stage latencies as a table, slowest median first"""
+    df = pd.DataFrame.from_dict(summary, orient="index")
+    return df.sort_values("p50", ascending=False).round(1)
 
-    if command:
-        cmd = command.strip().lower()
-        
-        # Clear previous results for new commands
-        if cmd not in ["satellite", "zoom in", "zoom out"]:
-            st.session_state.markers = []
-            st.session_state.route = None
-            st.session_state.distance = None
-            st.session_state.bounds = None
-            if cmd != "road layer" and not cmd.startswith("NH"):
-                st.session_state.road_layer = None
-                st.session_state.nh_layer = None
-                st.session_state.nh_number = None
-
-        # Process the command
-        if cmd == "satellite":
-            st.session_state.basemap = "SATELLITE"
-        elif cmd == "zoom in":
-            st.session_state.zoom = min(st.session_state.zoom + 1, 18)
-        elif cmd == "zoom out":
-            st.session_state.zoom = max(st.session_state.zoom - 1, 1)
-        elif cmd == "road layer":
+def show_latency():
+    """Per-stage latency percentiles for this app and the model server"""
+    if st.checkbox("Show voice pipeline latency (ms)"):
+        local = recorder.summary()
+        if local:
+            st.caption("This Streamlit process")
+            st.dataframe(latency_table(local))
+            st.bar_chart(latency_table(local)[["p50", "p95", "p99"]])
+        server = latency_summary()
+        if server:
+            st.caption("Model server")
+            st.dataframe(latency_table(server))
+        if not local and not server:
+            st.info("No voice commands processed yet")
+
+def fetch_ways(query, timeout=OVERPASS_TIMEOUT):
+    """Ways from an Overpass query as a GeoJSON FeatureCollection of LineStrings"""
+    response = http.post(OVERPASS_URL, data={'data': query}, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    features = []
+    for element in data.get('elements', []):
+        if element['type'] == 'way' and 'geometry' in element:
+            coordinates = [(node['lon'], node['lat']) for node in element['geometry']]
+            feature = {
+                "type": "Feature",
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": coordinates
+                },
+                "properties": element.get('tags', {})
+            }
+            features.append(feature)
+    return {"type": "FeatureCollection", "features": features}
+
+def is_nh_command(cmd):
+    # Commands arrive as "NH44"; place names can start with "nh" too
+    return cmd.startswith("nh") and cmd[2:].strip().isdigit()
+
+async def run_command(job):
+    """Network part of a command, on the command executor: (session state updates, errors)
+
+    Runs outside the script thread, so it must not touch st.* at all.
+    """
+    try:
+        return await command_updates(job)
+    finally:
+        recorder.record("execute_command", time.perf_counter() - job.submitted)
+
+async def command_updates(job):
+    """(session state updates, error messages) for the command of `job`"""
+    cmd = job.command.strip().lower()
+    updates, errors = {}, []
+
+    if cmd == "road layer":
+        try:
+            updates["road_layer"] = await job.step("road_layer", fetch_ways, ROAD_LAYER_QUERY,
+                                                   deadline=OVERPASS_TIMEOUT)
+        except StepFailed as e:
+            errors.append(f"Error fetching road layer: {str(e)}")
+    elif is_nh_command(cmd):
+        nh_num = cmd[2:].strip()
+        updates["nh_number"] = nh_num
+        try:
+            updates["nh_layer"] = await job.step("nh_layer", fetch_ways, NH_QUERY.format(nh_num=nh_num),
+                                                 deadline=OVERPASS_TIMEOUT)
+        except StepFailed as e:
+            errors.append(f"Error fetching NH{nh_num} data: {str(e)}")
+    else:
+        # Handle city names
+        cities = job.command.strip().split(" ")
+
+        if len(cities) == 1:
+            # Single city (Type1)
             try:
-                overpass_query = """
-                    [out:json];
-                    way["highway"~"motorway|trunk|primary|secondary|tertiary"](8.4,68.7,37.6,97.3);
-                    out geom;
-                """
-                response = requests.post(
-                    'http://overpass-api.de/api/interpreter',
-                    data={'data': overpass_query},
-                    timeout=30
-                )
-                response.raise_for_status()
-                data = response.json()
-                features = []
-                for element in data.get('elements', []):
-                    if element['type'] == 'way' and 'geometry' in element:
-                        coordinates = [(node['lon'], node['lat']) for node in element['geometry']]
-                        feature = {
-                            "type": "Feature",
-                            "geometry": {
-                                "type": "LineString",
-                                "coordinates": coordinates
-                            },
-                            "properties": element.get('tags', {})
-                        }
-                        features.append(feature)
-                st.session_state.road_layer = {"type": "FeatureCollection", "features": features}
-            except Exception as e:
-                st.error(f"Error fetching road layer: {str(e)}")
-                st.session_state.road_layer = None
-        elif cmd.startswith("NH"):
-            nh_num = cmd[2:].strip()
-            if nh_num.isdigit():
-                try:
-                    st.session_state.nh_number = nh_num
-                    overpass_query = f"""
-                        [out:json];
-                        way["ref"="NH{nh_num}"](8.4,68.7,37.6,97.3);
-                        out geom;
-                    """
-                    response = requests.post(
-                        'http://overpass-api.de/api/interpreter',
-                        data={'data': overpass_query},
-                        timeout=30
-                    )
-                    response.raise_for_status()
-                    data = response.json()
-                    features = []
-                    for element in data.get('elements', []):
-                        if element['type'] == 'way' and 'geometry' in element:
-                            coordinates = [(node['lon'], node['lat']) for node in element['geometry']]
-                            feature = {
-                                "type": "Feature",
-                                "geometry": {
-                                    "type": "LineString",
-                                    "coordinates": coordinates
-                                },
-                                "properties": element.get('tags', {})
-                            }
-                            features.append(feature)
-                    st.session_state.nh_layer = {"type": "FeatureCollection", "features": features}
-                except Exception as e:
-                    st.error(f"Error fetching NH{nh_num} data: {str(e)}")
-                    st.session_state.nh_layer = None
-            else:
-                st.error("Invalid National Highway number. Please use format like 'NH32'.")
-        else:
-            # Handle city names
-            cities = command.strip().split(" ")
-            geolocator = Nominatim(user_agent="geo_command")
-            
-            if len(cities) == 1:
-                # Single city (Type1)
-                location = geolocator.geocode(cities[0], country_codes='in')
-                if location:
-                    if is_within_india(location.latitude, location.longitude):
-                        st.session_state.markers.append(
-                            (location.latitude, location.longitude, cities[0])
-                        )
-                        st.session_state.center = [location.latitude, location.longitude]
-                        st.session_state.zoom = 12
-                    else:
-                        st.error(f"Location '{cities[0]}' is outside India")
+                location = await job.step("geocode", geocode, cities[0], deadline=GEOCODE_DEADLINE)
+            except StepFailed as e:
+                errors.append(f"Geocoding error: {str(e)}")
+                return updates, errors
+            if location:
+                if is_within_india(*location):
+                    updates["markers"] = [(location[0], location[1], cities[0])]
+                    updates["center"] = [location[0], location[1]]
+                    updates["zoom"] = 12
                 else:
-                    st.error(f"Location '{cities[0]}' not found in India")
-                    
-            elif len(cities) == 2:
-                # Two cities (Type3)
-                start = geolocator.geocode(cities[0], country_codes='in')
-                end = geolocator.geocode(cities[1], country_codes='in')
-                
-                valid = True
-                if not start:
-                    st.error(f"Start location '{cities[0]}' not found in India")
-                    valid = False
-                elif not is_within_india(start.latitude, start.longitude):
-                    st.error(f"Start location '{cities[0]}' is outside India")
+                    errors.append(f"Location '{cities[0]}' is outside India")
+            else:
+                errors.append(f"Location '{cities[0]}' not found in India")
+
+        elif len(cities) == 2:
+            # Two cities (Type3): both lookups at once, then the route
+            results = await asyncio.gather(
+                job.step("geocode_start", geocode, cities[0], deadline=GEOCODE_DEADLINE),
+                job.step("geocode_end", geocode, cities[1], deadline=GEOCODE_DEADLINE),
+                return_exceptions=True,
+            )
+
+            valid = True
+            for role, name, location in zip(("Start", "End"), cities, results):
+                if isinstance(location, BaseException):
+                    if not isinstance(location, StepFailed):
+                        raise location
+                    errors.append(f"Geocoding error for '{name}': {str(location)}")
                     valid = False
-                    
-                if not end:
-                    st.error(f"End location '{cities[1]}' not found in India")
+                elif not location:
+                    errors.append(f"{role} location '{name}' not found in India")
                     valid = False
-                elif not is_within_india(end.latitude, end.longitude):
-                    st.error(f"End location '{cities[1]}' is outside India")
+                elif not is_within_india(*location):
+                    errors.append(f"{role} location '{name}' is outside India")
                     valid = False
-                
-                if valid:
-                    route_coords, distance = get_route(
-                        (start.latitude, start.longitude),
-                        (end.latitude, end.longitude)
-                    )
-                    if route_coords:
-                        st.session_state.route = {
-                            "start": (start.latitude, start.longitude),
-                            "end": (end.latitude, end.longitude),
-                            "coords": route_coords,
-                            "start_name": cities[0],
-                            "end_name": cities[1]
-                        }
-                        st.session_state.distance = distance
-                        
-                        # Calculate bounds for the route
-                        lats = [p[0] for p in route_coords] + [start.latitude, end.latitude]
-                        lons = [p[1] for p in route_coords] + [start.longitude, end.longitude]
-                        st.session_state.bounds = [
-                            [min(lats), min(lons)], 
-                            [max(lats), max(lons)]
-                        ]
 
+            if valid:
+                start, end = results
+                try:
+                    route_coords, distance = await job.step("route", get_route, start, end,
+                                                            deadline=ROUTE_DEADLINE)
+                except StepFailed as e:
+                    errors.append(f"Routing error: {str(e)}")
+                    return updates, errors
+                if route_coords is not None:
+                    updates["route"] = {
+                        "start": start,
+                        "end": end,
+                        "coords": route_coords,
+                        "start_name": cities[0],
+                        "end_name": cities[1]
+                    }
+                    updates["distance"] = distance
+                    # Calculate bounds for the route
+                    updates["bounds"] = route_bounds(route_coords, start, end)
+
+    return updates, errors
+
+def execute_command(command):
+    """Apply a voice command: map controls at once, network lookups on the command executor"""
+    cmd = command.strip().lower()
+    is_nh = is_nh_command(cmd)
+
+    # Any newer command supersedes the one still in flight, whose late
+    # result would otherwise overwrite this one's center, zoom and markers
+    get_executor().cancel(st.session_state.session_key)
+    st.session_state.job = None
+
+    # Clear previous results for new commands
+    if cmd not in ["satellite", "zoom in", "zoom out"]:
+        st.session_state.markers = []
+        st.session_state.route = None
+        st.session_state.distance = None
+        st.session_state.bounds = None
+        if cmd != "road layer" and not is_nh:
+            st.session_state.road_layer = None
+            st.session_state.nh_layer = None
+            st.session_state.nh_number = None
+
+    # Process the command
+    if cmd == "satellite":
+        st.session_state.basemap = "SATELLITE"
+    elif cmd == "zoom in":
+        st.session_state.zoom = min(st.session_state.zoom + 1, 18)
+    elif cmd == "zoom out":
+        st.session_state.zoom = max(st.session_state.zoom - 1, 1)
+    else:
+        st.session_state.job = get_executor().submit(st.session_state.session_key, command, run_command)
+
+def apply_command(job):
+    """Copy a finished command's result into session state and show its errors"""
+    job.applied = True
+    if job.cancelled():
+        return
+    try:
+        updates, errors = job.result()
+    except Exception as e:
+        st.error(f"Error executing command: {str(e)}")
+        return
+    for key, value in updates.items():
+        st.session_state[key] = value
+    for message in errors:
+        st.error(message)
+
+def show_progress(job):
+    """Steps of the command in flight, with their state and duration"""
+    with st.status(f"Executing '{job.command}'...", expanded=True):
+        for name, state, seconds in job.progress():
+            st.write(f"{name}: {state}" + (f" ({seconds:.1f}s)" if seconds is not None else ""))
+
+def watch_command():
+    """Show progress until the command finishes, then rerun the app to apply it"""
+    job = st.session_state.job
+    if job is None or job.applied:
+        return
+    if job.done():
+        st.rerun()
+    show_progress(job)
+
+if HAS_FRAGMENTS:
+    # Polls on its own so the rest of the page (and the map) stays usable meanwhile
+    watch_command = fragment(run_every=PROGRESS_INTERVAL)(watch_command)
+
+def show_command():
+    """Apply the session's finished command, or follow the one in flight"""
+    job = st.session_state.job
+    if job is None or job.applied:
+        return
+    # Lookups answered locally finish in milliseconds and need no progress display
+    job.wait(PROGRESS_INTERVAL)
+    if not HAS_FRAGMENTS:
+        # No self-refreshing fragments: wait here, a new input still interrupts the script
+        placeholder = st.empty()
+        while not job.done():
+            with placeholder.container():
+                show_progress(job)
+            time.sleep(PROGRESS_INTERVAL)
+        placeholder.empty()
+    if job.done():
+        apply_command(job)
+    else:
+        watch_command()
+
+@fragment
+def render_map():
+    """Draw the map from session state; reruns inside it never touch the voice pipeline"""
     # Map initialization
+    map_start = time.perf_counter()
     m = leafmap.Map(center=st.session_state.center, zoom=st.session_state.zoom)
     m.add_basemap(st.session_state.basemap)
 
@@ -302,7 +391,98 @@ def app():
         m.fit_bounds(st.session_state.bounds)
 
     # Display the map
-    m.to_streamlit(height=700)
+    output = m.to_streamlit(height=700, bidirectional=True)
+    recorder.record("render_map", time.perf_counter() - map_start)
+    show_map_places(m, output)
+
+def show_map_places(m, output):
+    """Name the place at the map center and at the last click (local index only)"""
+    if not output:
+        return
+    lines = []
+    try:
+        center = m.st_map_center(output)
+    except Exception:
+        center = None
+    if center and (nearest := reverse_geocode(center[0], center[1])):
+        lines.append(f"Map center: {describe(nearest)}")
+    clicked = output.get("last_clicked")
+    if clicked and (nearest := reverse_geocode(clicked["lat"], clicked["lng"])):
+        lines.append(f"Clicked: {describe(nearest)}")
+    if lines:
+        st.caption("  \n".join(lines))
+
+def app():
+    st.title("Geospatial Command Processor")
+    
+    # Initialize session state
+    session_defaults = {
+        "zoom": 4,
+        "center": [20.5937, 78.9629],  # Default center (India)
+        "basemap": "ROADMAP",
+        "markers": [],
+        "route": None,
+        "distance": None,
+        "bounds": None,
+        "road_layer": None,
+        "nh_layer": None,
+        "nh_number": None,
+        "audio_digest": None,   # recording that was already turned into a command
+        "command": None,
+        "typed_place": None,
+        "session_key": uuid.uuid4().hex,   # identifies this session to the command executor
+        "job": None,            # network part of the last command (command_executor.Job)
+    }
+    for key, val in session_defaults.items():
+        if key not in st.session_state:
+            st.session_state[key] = val
+            
+    # Voice input section
+    st.subheader("Voice Commands")
+    audio_bytes = audio_recorder(text="Click to record command", pause_threshold=2.0)
+
+    # The recorder returns the same bytes on every rerun, so each recording is
+    # identified by its digest and processed exactly once
+    digest = hashlib.sha256(audio_bytes).hexdigest() if audio_bytes else None
+    if digest and digest != st.session_state.audio_digest:
+        st.session_state.audio_digest = digest
+        command = None
+        with st.spinner("Processing voice command..."):
+            try:
+                # Models live in the shared model server (or are loaded here as a fallback)
+                with span("voice_command"):
+                    command = process_audio(audio_bytes, timeout=VOICE_TIMEOUT)
+                print(command)
+                st.session_state.command = command
+                st.success(f"Detected command: {command}")
+            except (SchedulerBusy, ModelServerBusy) as e:
+                st.warning(str(e))
+            except Exception as e:
+                st.error(f"Error processing audio: {str(e)}")
+        if command:
+            execute_command(command)
+    elif st.session_state.command:
+        st.caption(f"Last command: {st.session_state.command}")
+
+    # Typed place search: completions come from the local index, Photon only
+    # when it has no match
+    place = place_typeahead("Or search for a place", key="place_search")
+    if place and place != st.session_state.typed_place:
+        st.session_state.typed_place = place
+        get_executor().cancel(st.session_state.session_key)
+        st.session_state.job = None
+        st.session_state.route = None
+        st.session_state.distance = None
+        st.session_state.bounds = None
+        st.session_state.markers = [(place.lat, place.lon, place.name)]
+        st.session_state.center = [place.lat, place.lon]
+        st.session_state.zoom = 12
+
+    show_command()
+
+    render_map()
+
+    show_latency()
 
 if __name__ == "__main__":
     app()
@@ -1,6 +1,8 @@
 import requests
+import pandas as pd
 import leafmap.foliumap as leafmap
 import streamlit as st
+from place_search import complete, Suggestion
 
 
 def search(name, limit):
@@ -14,6 +16,82 @@ def search(name, limit):
     return df
 
 
+def local_search(name, limit):
+    """Places from the local prefix index, in the same columns as search()"""
+    rows = [
+        {
+            "name": s.name,
+            "osm_key": s.feature_code,
+            "city": s.name,
+            "county": s.admin2,
+            "state": s.admin1,
+            "population": s.population,
+            "longitude": s.lon,
+            "latitude": s.lat,
+            "country": s.country,
+        }
+        for s in complete(name, limit)
+    ]
+    return pd.DataFrame(rows)
+
+
+def find_places(name, limit):
+    """Local index first; the remote Photon search only when nothing matches"""
+    df = local_search(name, limit)
+    return df if not df.empty else search(name, limit)
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def remote_suggestions(query, limit):
+    df = search(query, limit)
+    return [
+        Suggestion(row["name"], query, row.get("county"), row.get("state"), row["country"],
+                   row.get("osm_value"), 0, row["latitude"], row["longitude"])
+        for _, row in df.iterrows()
+    ]
+
+
+def suggest(query, limit=8):
+    """Typeahead completions, remote only when the local index has none"""
+    suggestions = complete(query, limit)
+    if not suggestions and len(query.strip()) >= 3:
+        try:
+            suggestions = remote_suggestions(query.strip(), limit)
+        except Exception:
+            suggestions = []
+    return suggestions
+
+
+def describe(suggestion):
+    parts = [suggestion.name, suggestion.admin1, suggestion.country]
+    return ", ".join(str(p) for p in parts if p and not pd.isna(p))
+
+
+def place_typeahead(label, key, limit=8):
+    """Place search box with completions; returns the chosen Suggestion or None
+
+    Uses streamlit-searchbox for per-keystroke suggestions when it is
+    installed, otherwise a text box with a list of matches.
+    """
+    try:
+        from streamlit_searchbox import st_searchbox
+    except ImportError:
+        st_searchbox = None
+    if st_searchbox:
+        return st_searchbox(
+            lambda query: [(describe(s), s) for s in suggest(query, limit)] if query else [],
+            label=label, key=key,
+        )
+    query = st.text_input(label, key=key)
+    if not query:
+        return None
+    suggestions = suggest(query, limit)
+    if not suggestions:
+        st.error("No results found")
+        return None
+    return st.selectbox("Matches", suggestions, format_func=describe, key=f"{key}_choice")
+
+
 def app():
 
     st.title('Search Geographic Names')
@@ -29,7 +107,7 @@ def app():
         name = st.text_input("Enter a name")
         if name:
             try:
-                df = search(name, limit)
+                df = find_places(name, limit)
                 if not df.empty:
                     column = st.selectbox(
                         "Filter by", df.columns, index=list(df.columns).index('country')
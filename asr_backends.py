@@ -0,0 +1,148 @@
+import os
+
+from model_cache import faster_whisper_path, load_whisper, whisper_path
+
+# Engine and model tier used by audio_to_text (override per deployment)
+ASR_ENGINE = os.environ.get("ASR_ENGINE", "whisper")
+ASR_MODEL_SIZE = os.environ.get("ASR_MODEL_SIZE", "large")
+# CTranslate2 weight type for faster-whisper: int8, int8_float32, float32, ...
+ASR_COMPUTE_TYPE = os.environ.get("ASR_COMPUTE_TYPE", "int8")
+# 0 lets the runtime pick one thread per physical core
+ASR_CPU_THREADS = int(os.environ.get("ASR_CPU_THREADS", "0"))
+
+MODEL_SIZES = ("tiny", "base", "small", "medium", "large")
+
+SAMPLE_RATE = 16000
+# Decoding stops after this many tokens per second of audio (speech is
+# rarely above 4), so a short command cannot run on to Whisper's 224 limit
+TOKENS_PER_SECOND = 8
+MAX_TOKENS = 224
+
+
+def token_budget(audios):
+    """Most tokens worth decoding for trimmed clips, or None for file paths"""
+    if any(isinstance(audio, str) for audio in audios):
+        return None
+    seconds = max(len(audio) for audio in audios) / SAMPLE_RATE
+    return min(MAX_TOKENS, int(seconds * TOKENS_PER_SECOND) + 16)
+
+
+def length_options(audios, option):
+    """Decoding options for the speech actually present in `audios`"""
+    budget = token_budget(audios)
+    return {option: budget, "without_timestamps": True} if budget else {}
+
+
+class WhisperBackend:
+    """Reference openai-whisper (PyTorch) backend"""
+
+    name = "whisper"
+
+    def __init__(self, size=ASR_MODEL_SIZE, device=None, initial_prompt=None, **_):
+        import whisper
+
+        self.size = size
+        self.initial_prompt = initial_prompt
+        # Memory-mapped weights from model_cache.py when prepared, else the checkpoint
+        prepared = whisper_path(size)
+        if os.path.exists(prepared):
+            self.model = load_whisper(prepared, size, device)
+        else:
+            self.model = whisper.load_model(size, device=device)
+        self.fp16 = self.model.device.type == "cuda"
+
+    def transcribe(self, audio, **options):
+        """Transcribe a file path or a 16 kHz float32 array"""
+        options = {**length_options([audio], "sample_len"), **options}
+        if self.initial_prompt:
+            options.setdefault("initial_prompt", self.initial_prompt)
+        result = self.model.transcribe(
+            audio, language="en", task="transcribe", fp16=self.fp16, **options
+        )
+        return result["text"].strip()
+
+    def transcribe_batch(self, audios):
+        """Decode several short clips in one forward pass
+
+        Every clip is padded to Whisper's 30 s window, so clips longer than
+        that are transcribed one by one instead.
+        """
+        import torch
+        import whisper
+
+        audios = [whisper.load_audio(a) if isinstance(a, str) else a for a in audios]
+        short = [i for i, a in enumerate(audios) if len(a) <= whisper.audio.N_SAMPLES]
+        texts = [None] * len(audios)
+        if len(short) > 1:
+            mel = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(audios[i]), n_mels=self.model.dims.n_mels)
+                for i in short
+            ]).to(self.model.device)
+            options = whisper.DecodingOptions(
+                language="en", task="transcribe", fp16=self.fp16, without_timestamps=True,
+                sample_len=token_budget([audios[i] for i in short]), prompt=self.initial_prompt,
+            )
+            for i, result in zip(short, whisper.decode(self.model, mel, options)):
+                texts[i] = result.text.strip()
+        return [text if text is not None else self.transcribe(audio)
+                for text, audio in zip(texts, audios)]
+
+
+class FasterWhisperBackend:
+    """CTranslate2 backend with int8-quantized weights, much faster on CPU"""
+
+    name = "faster-whisper"
+
+    def __init__(self, size=ASR_MODEL_SIZE, compute_type=ASR_COMPUTE_TYPE, device="cpu",
+                 cpu_threads=ASR_CPU_THREADS, initial_prompt=None, **_):
+        from faster_whisper import WhisperModel
+
+        self.size = size
+        self.compute_type = compute_type
+        self.initial_prompt = initial_prompt
+        prepared = faster_whisper_path(size)
+        self.model = WhisperModel(
+            prepared if os.path.isdir(prepared) else size,
+            device=device, compute_type=compute_type, cpu_threads=cpu_threads,
+        )
+
+    def transcribe(self, audio, beam_size=5, **options):
+        """Transcribe a file path or a 16 kHz float32 array"""
+        options = {**length_options([audio], "max_new_tokens"), **options}
+        if self.initial_prompt:
+            options.setdefault("initial_prompt", self.initial_prompt)
+        segments, _ = self.model.transcribe(
+            audio, language="en", task="transcribe", beam_size=beam_size, **options
+        )
+        # Segments are generated lazily, joining them runs the decoder
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def transcribe_batch(self, audios):
+        """Transcribe several clips (CTranslate2 already uses all cores per clip)"""
+        return [self.transcribe(audio) for audio in audios]
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+
+def load_backend(engine=ASR_ENGINE, size=ASR_MODEL_SIZE, **options):
+    """Create the ASR backend for `engine` with the `size` model tier
+
+    `initial_prompt` (optional) primes every decode with domain vocabulary.
+    """
+    if engine not in BACKENDS:
+        raise ValueError(f"Unknown ASR engine '{engine}', choose from {', '.join(BACKENDS)}")
+    if size not in MODEL_SIZES and not size.startswith(("large-", "distil-")) and not os.path.isdir(size):
+        raise ValueError(f"Unknown model size '{size}', choose from {', '.join(MODEL_SIZES)}")
+    return BACKENDS[engine](size=size, **options)
+
+
+def parse_backend_spec(spec):
+    """Parse 'engine:size[:compute_type]' as used on the command line"""
+    parts = spec.split(":")
+    engine, size = parts[0], parts[1] if len(parts) > 1 else ASR_MODEL_SIZE
+    options = {"compute_type": parts[2]} if len(parts) > 2 else {}
+    return engine, size, options
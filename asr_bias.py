@@ -0,0 +1,244 @@
+import os
+import re
+from functools import lru_cache
+
+from command_grammar import COMMAND_SYNONYMS
+from gazetteer import get_gazetteer, normalize_name
+from place_matcher import edit_distance, get_place_matcher
+
+# Prime the decoder with the app's vocabulary (initial prompt)
+ASR_BIAS_PROMPT = os.environ.get("ASR_BIAS_PROMPT", "0") == "1"
+# Snap near-miss command words, highway numbers and place names in the transcript
+ASR_POST_CORRECT = os.environ.get("ASR_POST_CORRECT", "0") == "1"
+# Places named in the prompt; Whisper keeps at most ~220 prompt tokens
+PROMPT_PLACES = int(os.environ.get("ASR_PROMPT_PLACES", "40"))
+
+# Used when no gazetteer is built
+DEFAULT_PLACES = (
+    "Delhi", "Mumbai", "Bengaluru", "Hyderabad", "Ahmedabad", "Chennai", "Kolkata", "Surat",
+    "Pune", "Jaipur", "Lucknow", "Kanpur", "Nagpur", "Indore", "Bhopal", "Visakhapatnam",
+    "Patna", "Vadodara", "Ludhiana", "Agra", "Varanasi", "Srinagar", "Amritsar", "Chandigarh",
+    "Guwahati", "Thiruvananthapuram", "Kochi", "Mysuru", "Dehradun", "Bhubaneswar",
+)
+
+_UNITS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+          "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen",
+          "eighteen", "nineteen"]
+_TENS = ["twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+NUMBER_WORDS = {word: i for i, word in enumerate(_UNITS)}
+NUMBER_WORDS.update({word: 20 + 10 * i for i, word in enumerate(_TENS)})
+NUMBER_WORDS["hundred"] = 100
+
+
+def _any_word(words):
+    """Regex for any one of `words`, as a whole word"""
+    return "(?:" + "|".join(sorted(words, key=len, reverse=True)) + r")\b"
+
+
+_SEP = r"[\s-]+"
+_DIGIT = _any_word(_UNITS[:10])
+_UNIT = _any_word(_UNITS[1:10])
+_BELOW_HUNDRED = rf"(?:{_any_word(_TENS)}(?:{_SEP}{_UNIT})?|{_any_word(_UNITS[10:])}|{_UNIT})"
+# Only whole number shapes, and nothing after them: "forty four", "four four",
+# "one hundred and six", "forty seven"; never a bare "hundred"
+_SPOKEN_NUMBER = (
+    rf"{_UNIT}{_SEP}hundred\b(?:{_SEP}(?:and{_SEP})?{_BELOW_HUNDRED})?"
+    rf"|{_any_word(_TENS)}(?:{_SEP}{_UNIT})?"
+    rf"|{_DIGIT}(?:{_SEP}{_DIGIT}){{1,2}}"
+    rf"|{_BELOW_HUNDRED}"
+)
+# "national highway forty four", "n h 48", "N.H.-27", "en h 8"; a bare "highway"
+# is ordinary speech ("via the highway one more time") and is left alone
+HIGHWAY_REGEX = re.compile(
+    r"\b(?:national\s+high\s*way|n\.?\s*h\.?|en\s*h)\s*-?\s*"
+    rf"(?P<number>\d+\b|{_SPOKEN_NUMBER})",
+    re.IGNORECASE,
+)
+
+# Multi-word phrases are snapped as a whole when one of their words is heard exactly
+COMMAND_PHRASES = sorted(
+    {phrase for phrases in COMMAND_SYNONYMS.values() for phrase in phrases if " " in phrase}
+    | {"national highway"}
+)
+# Words that tell a phrase apart from the others ("in" for "zoom in", "layer" for
+# "road layer"); when a phrase shares a word with another, these must all be heard exactly
+PHRASE_KEYS = {
+    phrase: {
+        j for j, word in enumerate(phrase.split())
+        if not any(word in other.split() for other in COMMAND_PHRASES if other != phrase)
+    }
+    for phrase in COMMAND_PHRASES
+}
+# Single-word synonyms long enough to be snapped at edit distance 1, and only next to
+# words that make the clause a map control ("switch to satelite view")
+COMMAND_WORDS = sorted(
+    phrase for phrases in COMMAND_SYNONYMS.values() for phrase in phrases
+    if " " not in phrase and len(phrase) >= 6
+)
+CONTEXT_WORDS = {"switch", "change", "toggle", "turn", "enable", "view", "mode", "map", "layer",
+                 "imagery", "zoom", "screen"}
+# Words after these name a place or a route ("the shrine in Amritsar"), never a command
+PLACE_PREPOSITIONS = {"from", "in", "near", "at", "of", "via", "between", "around"}
+
+
+def words_to_number(words):
+    """'forty four' -> 44, 'four four' -> 44, 'one hundred and six' -> 106"""
+    values = [NUMBER_WORDS[w] for w in words if w != "and"]
+    if len(values) > 1 and all(v < 10 for v in values):
+        # Spoken digit by digit
+        return int("".join(map(str, values)))
+    total = 0
+    for value in values:
+        total = total * 100 if value == 100 else total + value
+    return total
+
+
+def _highway(match):
+    number = match.group("number")
+    number = int(number) if number.isdigit() else words_to_number(re.split(r"[\s-]+", number.lower()))
+    # There is no NH0
+    return f"NH{number}" if number else match.group(0)
+
+
+def _names_place(lowered, start, matcher, max_words=3):
+    """Do the words from `start` on begin with a place name"""
+    for n in range(min(max_words, len(lowered) - start), 0, -1):
+        name = " ".join(lowered[start:start + n])
+        if matcher is not None and matcher.best(name) is not None:
+            return True
+        if name in _DEFAULT_PLACE_KEYS:
+            return True
+    return False
+
+
+_DEFAULT_PLACE_KEYS = {normalize_name(place) for place in DEFAULT_PLACES}
+
+
+def _snap_phrases(words, lowered, replacements, command, matcher=None):
+    """Near-miss multi-word command phrases ("zum in", "stret map")"""
+    for phrase in COMMAND_PHRASES:
+        parts = phrase.split()
+        keys = PHRASE_KEYS[phrase]
+        shared = len(keys) < len(parts)
+        for i in range(len(words) - len(parts) + 1):
+            window = lowered[i:i + len(parts)]
+            if any(command[i:i + len(parts)]):
+                continue
+            heard = " ".join(window)
+            if heard == phrase:
+                command[i:i + len(parts)] = [True] * len(parts)
+                continue
+            exact = {j for j in keys if window[j] == parts[j]}
+            # "zoom on" is not "zoom in"; "stret map" is still "street map"
+            if (exact != keys) if shared else not exact:
+                continue
+            if edit_distance(heard, phrase, 1) > 1:
+                continue
+            # "Room in Delhi": the clause goes on to name a place, it is not a command
+            if parts[-1] in PLACE_PREPOSITIONS and _names_place(lowered, i + len(parts), matcher):
+                continue
+            command[i:i + len(parts)] = [True] * len(parts)
+            replacements.append((words[i].start(), words[i + len(parts) - 1].end(), phrase))
+
+
+def _snap_words(words, lowered, replacements, command):
+    """Near-miss single-word synonyms, only inside a map-control clause"""
+    in_place = False
+    for i, word in enumerate(words):
+        token = lowered[i]
+        if command[i] or token in CONTEXT_WORDS:
+            in_place = False
+            continue
+        if token in PLACE_PREPOSITIONS:
+            in_place = True
+            continue
+        # Capitalized mid-sentence words are names
+        if in_place or len(token) < 6 or token in COMMAND_WORDS or (i and word.group(0)[0].isupper()):
+            continue
+        nearby = lowered[max(i - 2, 0):i] + lowered[i + 1:i + 3]
+        if not any(w in CONTEXT_WORDS for w in nearby):
+            continue
+        for known in COMMAND_WORDS:
+            if edit_distance(token, known, 1) <= 1:
+                replacements.append((word.start(), word.end(), known))
+                break
+
+
+def snap_commands(text, matcher=None):
+    """Snap misheard command words and phrases to the command vocabulary"""
+    words = list(re.finditer(r"[A-Za-z']+", text))
+    lowered = [w.group(0).lower() for w in words]
+    command = [False] * len(words)
+    replacements = []
+    _snap_phrases(words, lowered, replacements, command, matcher)
+    _snap_words(words, lowered, replacements, command)
+    for start, end, replacement in sorted(replacements, reverse=True):
+        text = text[:start] + replacement + text[end:]
+    return text
+
+
+def _snap_places(text, matcher):
+    tokens = list(re.finditer(r"\S+", text))
+    keys, positions = [], []
+    for i, token in enumerate(tokens):
+        key = normalize_name(token.group(0))
+        # Skip punctuation and tokens with digits (NH44) or inner separators
+        if key and key.isalpha():
+            keys.append(key)
+            positions.append(i)
+
+    pieces, last = [], 0
+    for start, end, match in matcher.scan(keys):
+        if match.distance == 0:
+            continue
+        first, final = tokens[positions[start]], tokens[positions[end - 1]]
+        # Keep trailing punctuation of the replaced words
+        tail = re.search(r"\W*$", final.group(0)).group(0)
+        pieces.append(text[last:first.start()] + match.label + tail)
+        last = final.end()
+    return "".join(pieces) + text[last:]
+
+
+def correct_transcript(text, matcher=None):
+    """Constrained post-correction of a transcript
+
+    Only rewrites what the grammar and the gazetteer know: highway numbers
+    after "national highway" or "NH" (spoken or mangled) become NH<n>,
+    misspelled command phrases are snapped to the command vocabulary (single
+    words only in a map-control clause, phrases only when the word that sets
+    them apart was heard exactly and no place follows) and near-miss place
+    names to gazetteer places.
+    """
+    matcher = matcher if matcher is not None else get_place_matcher()
+    text = snap_commands(text, matcher)
+    text = HIGHWAY_REGEX.sub(_highway, text)
+    if matcher is not None:
+        text = _snap_places(text, matcher)
+    return text
+
+
+def top_places(limit=PROMPT_PLACES):
+    """Most populous place names from the gazetteer"""
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return list(DEFAULT_PLACES[:limit])
+    names = []
+    for place in gazetteer.places(min_population=100000):
+        if place.name not in names:
+            names.append(place.name)
+        if len(names) == limit:
+            break
+    return names
+
+
+@lru_cache(maxsize=1)
+def build_prompt(limit=PROMPT_PLACES):
+    """Initial prompt listing the commands, highway numbering and common places"""
+    commands = ", ".join(phrase for phrases in COMMAND_SYNONYMS.values() for phrase in phrases)
+    return (f"Map commands: {commands}. National highways: NH44, NH48, NH27. "
+            f"Places: {', '.join(top_places(limit))}.")
+
+
+def bias_prompt():
+    """The initial prompt for the shared ASR model, or None when biasing is off"""
+    return build_prompt() if ASR_BIAS_PROMPT else None
@@ -80,67 +80,240 @@
 
 
 
-import whisper
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from functools import lru_cache
 import librosa
 import noisereduce as nr
 import soundfile as sf
 import numpy as np
 import scipy.signal as signal
-import spacy
-import re
-import requests
-
-# Load models once
-def load_models():
-    """Load ML models only once"""
-    model = whisper.load_model("large")
-    nlp = spacy.load("en_core_web_trf")  # Use transformer-based model for better accuracy
-    return model, nlp
-
-model, nlp = load_models()
-
-# Gazetteer for local places (can be expanded or replaced with an API query)
-GAZETTEER = {"smallville", "rivertown", "hilltop", "springfield"}  # Example locations
-
-
-def query_geonames(place_name):
-    """Query GeoNames API for better place name resolution"""
-    url = f"http://api.geonames.org/searchJSON?q={place_name}&maxRows=1&username=demo"  # Replace 'demo' with your GeoNames username
-    try:
-        response = requests.get(url)
-        data = response.json()
-        if data["geonames"]:
-            return data["geonames"][0]["name"]
-    except:
-        pass
-    return None
-
-
-def preprocess_audio(input_path):
-    """Audio preprocessing pipeline"""
-    y, sr = librosa.load(input_path, sr=None, mono=True)
-    
+from asr_backends import ASR_ENGINE, ASR_MODEL_SIZE, ASR_COMPUTE_TYPE, load_backend
+from place_matcher import get_place_matcher
+from latency import span
+from nlp_modes import describe_nlp, load_nlp
+from asr_bias import ASR_POST_CORRECT, bias_prompt, correct_transcript
+from inference_queue import InferenceScheduler
+from command_grammar import COMMAND_SYNONYMS, match_command
+from transcript_cache import TranscriptCache, audio_key
+
+# Pipeline chosen by NLP_MODE: the full transformer NER by default, "lean" for
+# gazetteer rules with a small statistical fallback
+SPACY_MODEL = describe_nlp()
+
+
+_asr = None
+_nlp = None
+_scheduler = None
+_load_lock = threading.Lock()
+# spaCy pipelines are not safe to call from several threads at once
+_nlp_lock = threading.Lock()
+
+# Route transcriptions through the bounded, batching inference queue
+USE_INFERENCE_QUEUE = os.environ.get("INFERENCE_QUEUE", "1") == "1"
+
+
+def get_asr():
+    """Load the ASR backend on first use and reuse it afterwards"""
+    global _asr
+    with _load_lock:
+        if _asr is None:
+            _asr = load_backend(initial_prompt=bias_prompt())
+    return _asr
+
+
+def get_nlp():
+    """Load the spaCy pipeline on first use and reuse it afterwards"""
+    global _nlp
+    with _load_lock:
+        if _nlp is None:
+            _nlp = load_nlp()
+    return _nlp
+
+
+def get_scheduler():
+    """Shared inference queue in front of the ASR backend"""
+    global _scheduler
+    backend = get_asr()
+    with _load_lock:
+        if _scheduler is None:
+            _scheduler = InferenceScheduler(backend.transcribe_batch)
+    return _scheduler
+
+
+def get_models():
+    """Load models on first use and reuse them afterwards"""
+    return get_asr(), get_nlp()
+
+
+# Sample rate Whisper expects
+TARGET_SR = 16000
+
+# Front-end stages; each one can be switched off or tuned per call
+PREPROCESS_CONFIG = {
+    "res_type": "soxr_hq",          # librosa resampler
+    "noise_reduction": True,
+    "noise_reduction_options": {},  # passed to noisereduce.reduce_noise
+    "bandpass": (300, 3400),        # (lowcut, highcut) in Hz, or None to skip
+    "filter_order": 4,
+    "zero_phase": True,             # forward-backward filtering like filtfilt
+    "trim_silence": True,           # keep only the speech region
+    "trim_options": {},             # passed to speech_region
+    "normalize": True,
+}
+
+# Set to a directory to keep a copy of every processed clip for debugging
+DEBUG_DUMP_DIR = os.environ.get("AUDIO_DEBUG_DIR")
+
+# Results keyed by a hash of the decoded audio, so reruns and retries skip the models.
+# Bump CACHE_VERSION whenever the command logic changes.
+CACHE_VERSION = 8
+transcript_cache = TranscriptCache(
+    max_entries=int(os.environ.get("TRANSCRIPT_CACHE_SIZE", "256")),
+    directory=os.environ.get("TRANSCRIPT_CACHE_DIR"),
+)
+
+def load_audio(audio, sr=None):
+    """Decode recorder bytes, a NumPy buffer or a file path into mono float32"""
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        y, sr = sf.read(io.BytesIO(audio), dtype="float32")
+    elif isinstance(audio, np.ndarray):
+        if sr is None:
+            raise ValueError("Sample rate is required when passing a NumPy buffer")
+        y = audio
+    else:
+        y, sr = librosa.load(audio, sr=None, mono=True)
+
+    # Down-mix (frames, channels) to mono
+    if y.ndim > 1:
+        y = y.mean(axis=1)
+    return np.asarray(y, dtype=np.float32), sr
+
+
+@lru_cache(maxsize=16)
+def bandpass_sos(sr, lowcut, highcut, order):
+    """Butterworth band-pass as float32 second-order sections (designed once per rate)"""
+    sos = signal.butter(order, [lowcut, highcut], btype="band", fs=sr, output="sos")
+    return sos.astype(np.float32)
+
+
+def speech_region(y, sr, frame_ms=30, db_above_floor=12, db_below_peak=40, silence_db=-90,
+                  min_speech_s=0.1, padding_s=0.2):
+    """(start, end) sample range that contains speech, or None when there is none
+
+    Frames count as speech when they are `db_above_floor` above the clip's
+    noise floor (its 10th percentile frame energy) and within `db_below_peak`
+    of its loudest frame. Both are relative, so quiet but clean recordings
+    are kept. Digital silence (below `silence_db`) and flat clips with
+    nothing above the floor, such as room noise or dither, count as empty.
+    Single-frame clicks are ignored and `padding_s` is kept on both sides.
+    """
+    frame = sr * frame_ms // 1000
+    n = len(y) // frame
+    if n == 0:
+        return None
+    frames = y[:n * frame].reshape(n, frame)
+    energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    floor, peak = np.percentile(energy_db, 10), energy_db.max()
+    if peak < silence_db or peak - floor < db_above_floor:
+        # Silence, or steady noise without anything standing out of it
+        return None
+
+    voiced = energy_db > max(floor + db_above_floor, peak - db_below_peak)
+    voiced = np.convolve(voiced, np.ones(3), "same") >= 2
+    if voiced.sum() * frame < min_speech_s * sr:
+        return None
+    first, last = np.flatnonzero(voiced)[[0, -1]]
+    pad = int(padding_s * sr)
+    return max(0, first * frame - pad), min(len(y), (last + 1) * frame + pad)
+
+
+def preprocess_audio(audio, sr=None, config=None, timings=None):
+    """Audio preprocessing pipeline
+
+    Everything runs in float32 at 16 kHz: the clip is resampled first so the
+    later stages touch 3x fewer samples. Only the speech region is returned
+    (empty when there is no speech). `config` overrides PREPROCESS_CONFIG
+    and `timings` (a dict) receives the seconds spent in each stage.
+    """
+    config = {**PREPROCESS_CONFIG, **(config or {})}
+
+    if isinstance(audio, np.ndarray):
+        y, sr = load_audio(audio, sr)
+    else:
+        with span("load", timings):
+            y, sr = load_audio(audio, sr)
+
+    # Resampling
+    if sr != TARGET_SR:
+        with span("resample", timings):
+            y = librosa.resample(y, orig_sr=sr, target_sr=TARGET_SR, res_type=config["res_type"])
+            y = y.astype(np.float32, copy=False)
+
     # Noise reduction
-    y_denoised = nr.reduce_noise(y=y, sr=sr)
-    
+    if config["noise_reduction"]:
+        with span("noise_reduction", timings):
+            y = nr.reduce_noise(y=y, sr=TARGET_SR, **config["noise_reduction_options"])
+            y = y.astype(np.float32, copy=False)
+
     # Band-pass filter
-    lowcut, highcut = 300, 3400
-    nyquist = 0.5 * sr
-    b, a = signal.butter(4, [lowcut/nyquist, highcut/nyquist], btype="band")
-    y_filtered = signal.filtfilt(b, a, y_denoised)
-    
+    if config["bandpass"]:
+        with span("bandpass", timings):
+            lowcut, highcut = config["bandpass"]
+            sos = bandpass_sos(TARGET_SR, lowcut, highcut, config["filter_order"])
+            y = signal.sosfiltfilt(sos, y) if config["zero_phase"] else signal.sosfilt(sos, y)
+
+    # Silence trimming: leading/trailing silence only costs decoding time, an
+    # empty result means the clip has no speech at all
+    if config["trim_silence"]:
+        with span("trim_silence", timings):
+            region = speech_region(y, TARGET_SR, **config["trim_options"])
+            y = y[region[0]:region[1]] if region else y[:0]
+
     # Normalization
-    y_normalized = y_filtered / np.max(np.abs(y_filtered))
-    
-    # Resampling
-    y_resampled = librosa.resample(y_normalized, orig_sr=sr, target_sr=16000)
-    return y_resampled, 16000
+    if config["normalize"]:
+        with span("normalize", timings):
+            peak = np.max(np.abs(y)) if len(y) else 0
+            if peak > 0:
+                y = y * np.float32(1 / peak)
+
+    return y, TARGET_SR
+
 
+def dump_audio(y, sr, directory):
+    """Write a processed clip to `directory` under a unique name"""
+    os.makedirs(directory, exist_ok=True)
+    name = f"processed_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.wav"
+    path = os.path.join(directory, name)
+    sf.write(path, y, sr)
+    return path
 
-def transcribe_audio(audio_path):
-    """Transcribe speech to text"""
-    result = model.transcribe(audio_path, language='en', task='transcribe')
-    return result["text"].strip()
+
+def transcribe_audio(audio, backend=None, timeout=None, correct=None):
+    """Transcribe speech to text (file path or 16 kHz float32 array)
+
+    Unless a specific `backend` is given, the clip goes through the shared
+    inference queue: it may be batched with other sessions' clips, raises
+    SchedulerBusy when the queue is full and DeadlineExceeded after `timeout`.
+    With `correct` (default ASR_POST_CORRECT) the transcript is snapped to
+    the command vocabulary and known places.
+    """
+    if backend is not None:
+        text = backend.transcribe(audio)
+    elif USE_INFERENCE_QUEUE:
+        text = get_scheduler().transcribe(audio, timeout)
+    else:
+        text = get_asr().transcribe(audio)
+    if correct is None:
+        correct = ASR_POST_CORRECT
+    if correct:
+        with span("post_correct"):
+            text = correct_transcript(text)
+    return text
 
 
 # def extract_geopolitical_entities(text):
@@ -160,47 +333,104 @@ def transcribe_audio(audio_path):
 #     return list(validated_entities)
 
 
-def text_to_command(text):
-    """Convert transcribed text to geospatial commands"""
-    text_lower = text.lower()
-    doc = nlp(text)
-    cities = [ent.text for ent in doc.ents if ent.label_ == "GPE"]
-    satellite_words = {"satellite", "aerial", "bird's eye"}
-    road_layer_words = {"road layer", "street map", "road view"}
-    zoom_in_words = {"zoom in", "magnify", "enlarge"}
-    zoom_out_words = {"zoom out", "minimize", "shrink"}
-    nh_pattern = r"(?:national highway|NH)\s*(\d+)"
+def extract_places(text):
+    """Place names (GPE entities) mentioned in the text"""
+    nlp = get_nlp()
+    with _nlp_lock:
+        doc = nlp(text)
+    return [ent.text for ent in doc.ents if ent.label_ == "GPE"]
 
-    
-    print("\n\n\n", cities, "\n\n\n")
-    
-    # Command detection logic
-    if any(word in text_lower for word in satellite_words):
-        return "satellite"
-    if any(word in text_lower for word in road_layer_words):
-        return "road layer"
-    if any(re.search(rf"\b{word}\b", text_lower) for word in zoom_in_words):
-        return "zoom in"
-    if any(re.search(rf"\b{word}\b", text_lower) for word in zoom_out_words):
-        return "zoom out"
-    if nh_match := re.search(r"national highway (\d+)", text_lower):
-       return f"NH{nh_match.group(1)}"
+
+def parse_command(text):
+    """Convert transcribed text to a command and the places it mentions
+
+    Control commands come from the precompiled grammar; NER only runs when
+    none of them matched.
+    """
+    with span("grammar"):
+        command = match_command(text)
+    if command:
+        return command, []
+
+    with span("ner"):
+        cities = extract_places(text)
+    # Snap near-miss spellings to known places and catch places NER missed
+    if matcher := get_place_matcher():
+        with span("place_match"):
+            cities = matcher.resolve(text, cities)
+    print("Places:", cities)
 
     # Handle city names
     if len(cities) == 1:
-        return cities[0]
+        return cities[0], cities
     if len(cities) == 2:
-        return f"{cities[0]} {cities[1]}"
+        return f"{cities[0]} {cities[1]}", cities
     
-    return "No valid command"
+    return "No valid command", cities
+
+
+def text_to_command(text):
+    """Convert transcribed text to geospatial commands"""
+    return parse_command(text)[0]
+
+
+def pipeline_version():
+    """Identify everything that changes the result for the same audio"""
+    config = json.dumps([PREPROCESS_CONFIG, COMMAND_SYNONYMS, bias_prompt(), ASR_POST_CORRECT],
+                        sort_keys=True)
+    return f"{CACHE_VERSION}|{ASR_ENGINE}:{ASR_MODEL_SIZE}:{ASR_COMPUTE_TYPE}|{SPACY_MODEL}|{config}"
+
 
+def process_audio_detailed(audio, sr=None, debug_dump=None, use_cache=True):
+    """End-to-end processing pipeline returning every intermediate result
 
-def process_audio(audio_path):
+    `audio` can be the raw WAV bytes from the recorder, a NumPy buffer (with `sr`)
+    or a file path. Nothing is written to disk unless `debug_dump` (or the
+    AUDIO_DEBUG_DIR environment variable) names a directory. Returns a dict with
+    the transcript, command, place entities and the seconds spent in each stage.
+    Identical audio is answered from `transcript_cache` (`"cached": True`).
+    """
+    timings = {}
+    with span("load", timings):
+        y, sr = load_audio(audio, sr)
+
+    if use_cache:
+        with span("cache_lookup", timings):
+            key = audio_key(y, sr, pipeline_version())
+            cached = transcript_cache.get(key)
+        if cached is not None:
+            return {**cached, "timings": timings, "cached": True}
+
+    processed_audio, sr = preprocess_audio(y, sr, timings=timings)
+
+    debug_dump = debug_dump or DEBUG_DUMP_DIR
+    if debug_dump:
+        print("Processed audio saved to", dump_audio(processed_audio, sr, debug_dump))
+
+    if len(processed_audio):
+        # The clip is trimmed to the speech, so its length bounds the decoding
+        with span("transcribe", timings):
+            transcription = transcribe_audio(processed_audio)
+        with span("text_to_command", timings):
+            command, places = parse_command(transcription)
+    else:
+        # Nothing but silence, skip the models
+        transcription, command, places = "", "No valid command", []
+
+    result = {
+        "transcript": transcription,
+        "command": command,
+        "entities": places,
+        "duration": len(processed_audio) / sr,
+    }
+    if use_cache:
+        transcript_cache.put(key, result)
+    return {**result, "timings": timings, "cached": False}
+
+
+def process_audio(audio, sr=None, debug_dump=None):
     """End-to-end processing pipeline"""
-    processed_audio, sr = preprocess_audio(audio_path)
-    temp_path = "temp_processed.wav"
-    sf.write(temp_path, processed_audio, sr)
-    
-    transcription = transcribe_audio(temp_path)
-    print("Transcription:", transcription)
-    return text_to_command(transcription)
\ No newline at end of file
+    result = process_audio_detailed(audio, sr, debug_dump)
+    print("Transcription:", result["transcript"], "(cached)" if result["cached"] else "")
+    print("Timings:", ", ".join(f"{stage} {sec * 1000:.0f} ms" for stage, sec in result["timings"].items()))
+    return result["command"]
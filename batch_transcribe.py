@@ -0,0 +1,118 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from asr_backends import ASR_ENGINE, BACKENDS
+
+AUDIO_EXTENSIONS = {".wav", ".flac", ".ogg", ".mp3", ".m4a", ".webm"}
+
+
+def find_recordings(inputs):
+    """Expand files, directories (recursively) and glob patterns into audio paths"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(os.path.join(root, f) for f in files
+                             if os.path.splitext(f)[1].lower() in AUDIO_EXTENSIONS)
+        elif os.path.isfile(item):
+            paths.append(item)
+        else:
+            paths.extend(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+    return sorted({os.path.abspath(p) for p in paths})
+
+
+def load_done(output, retry_errors=False):
+    """Paths that already have a record in the output file"""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partially written last line from an interrupted run
+            if retry_errors and "error" in record:
+                continue
+            done.add(record["path"])
+    return done
+
+
+def init_worker(threads, engine=ASR_ENGINE):
+    """Load the models once per worker process"""
+    # Read by asr_backends when audio_to_text is imported below
+    os.environ["ASR_ENGINE"] = engine
+    if threads:
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        os.environ["ASR_CPU_THREADS"] = str(threads)
+        # faster-whisper takes ASR_CPU_THREADS; only openai-whisper runs on torch
+        if engine == "whisper":
+            import torch
+            torch.set_num_threads(threads)
+
+    import audio_to_text
+    audio_to_text.get_models()
+
+
+def transcribe_file(path):
+    """Run the full pipeline on one recording and return its JSONL record"""
+    import audio_to_text
+
+    start = time.perf_counter()
+    try:
+        record = {"path": path, **audio_to_text.process_audio_detailed(path)}
+    except Exception as e:
+        record = {"path": path, "error": f"{type(e).__name__}: {e}"}
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Transcribe many recordings in parallel and write one JSON record per file"
+    )
+    parser.add_argument("inputs", nargs="+", help="audio files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default="transcripts.jsonl")
+    parser.add_argument("-j", "--workers", type=int, default=max(1, (os.cpu_count() or 2) // 4),
+                        help="worker processes (each loads its own models)")
+    parser.add_argument("--engine", choices=sorted(BACKENDS), default=ASR_ENGINE,
+                        help="ASR engine (default: ASR_ENGINE)")
+    parser.add_argument("--threads-per-worker", type=int, default=0,
+                        help="inference threads per worker (0 = library default)")
+    parser.add_argument("--retry-errors", action="store_true",
+                        help="reprocess files whose previous record is an error")
+    args = parser.parse_args()
+
+    paths = find_recordings(args.inputs)
+    done = load_done(args.output, args.retry_errors)
+    todo = [p for p in paths if p not in done]
+    print(f"{len(paths)} recordings, {len(paths) - len(todo)} already done, {len(todo)} to process")
+    if not todo:
+        return
+
+    start = time.perf_counter()
+    failed = 0
+    # spawn: workers must not inherit a half-initialized torch from the parent
+    context = multiprocessing.get_context("spawn")
+    with open(args.output, "a") as out, ProcessPoolExecutor(
+        max_workers=args.workers, mp_context=context,
+        initializer=init_worker, initargs=(args.threads_per_worker, args.engine),
+    ) as pool:
+        futures = [pool.submit(transcribe_file, path) for path in todo]
+        for i, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            failed += "error" in record
+            out.write(json.dumps(record) + "\n")
+            out.flush()  # every finished file survives an interruption
+            if i % 10 == 0 or i == len(todo):
+                rate = i / (time.perf_counter() - start)
+                print(f"{i}/{len(todo)} done ({rate:.2f} files/s, {failed} failed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+from asr_backends import load_backend, parse_backend_spec
+from asr_bias import build_prompt
+from audio_to_text import TARGET_SR, preprocess_audio, transcribe_audio, text_to_command
+
+DEFAULT_BACKENDS = [
+    "whisper:large",
+    "faster-whisper:small:int8",
+    "faster-whisper:base:int8",
+    "faster-whisper:tiny:int8",
+]
+
+
+def load_clips(manifest):
+    """Read a manifest CSV with `path` and `expected` (command) columns"""
+    root = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, newline="") as f:
+        return [
+            {"path": os.path.join(root, row["path"]), "expected": row["expected"]}
+            for row in csv.DictReader(f)
+        ]
+
+
+def commands_match(command, expected):
+    """Compare commands the way home.app() interprets them"""
+    return command.strip().lower() == expected.strip().lower()
+
+
+def load_spec(spec):
+    """Load the backend named by `spec` and time it"""
+    engine, size, options = parse_backend_spec(spec)
+    start = time.perf_counter()
+    backend = load_backend(engine, size, **options)
+    return backend, time.perf_counter() - start
+
+
+def benchmark_backend(spec, clips, warmup=1, bias=False, loaded=None):
+    """Transcribe every clip with one backend and collect speed and accuracy
+
+    With `bias` the decoder gets the domain prompt and transcripts are
+    post-corrected. `loaded` reuses a (backend, load seconds) pair from `load_spec`.
+    """
+    backend, load_time = loaded or load_spec(spec)
+    backend.initial_prompt = build_prompt() if bias else None
+
+    for clip in clips[:warmup]:
+        transcribe_audio(clip["audio"], backend=backend, correct=bias)
+
+    results = []
+    for clip in clips:
+        start = time.perf_counter()
+        text = transcribe_audio(clip["audio"], backend=backend, correct=bias)
+        elapsed = time.perf_counter() - start
+        command = text_to_command(text)
+        results.append({
+            "path": clip["path"],
+            "duration": clip["duration"],
+            "seconds": elapsed,
+            "transcript": text,
+            "command": command,
+            "expected": clip["expected"],
+            "correct": commands_match(command, clip["expected"]),
+        })
+
+    audio_seconds = sum(r["duration"] for r in results)
+    decode_seconds = sum(r["seconds"] for r in results)
+    return {
+        "backend": f"{spec}+bias" if bias else spec,
+        "load_seconds": load_time,
+        "clips": len(results),
+        "rtf": decode_seconds / audio_seconds if audio_seconds else None,
+        "mean_latency": decode_seconds / len(results) if results else None,
+        "accuracy": sum(r["correct"] for r in results) / len(results) if results else None,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Real-time factor and command accuracy of ASR engines/model sizes"
+    )
+    parser.add_argument("manifest", help="CSV with `path` and `expected` columns")
+    parser.add_argument("--backends", nargs="+", default=DEFAULT_BACKENDS,
+                        help="engine:size[:compute_type], e.g. faster-whisper:small:int8")
+    parser.add_argument("--bias", action="store_true",
+                        help="also run every backend with the domain prompt and post-correction")
+    parser.add_argument("--output", help="write the full results as JSON")
+    args = parser.parse_args()
+
+    clips = load_clips(args.manifest)
+    # Preprocess once so only the ASR stage is compared
+    for clip in clips:
+        clip["audio"], _ = preprocess_audio(clip["path"])
+        clip["duration"] = len(clip["audio"]) / TARGET_SR
+
+    reports = []
+    print(f"{'backend':<32}{'load s':>8}{'RTF':>8}{'latency s':>11}{'accuracy':>10}")
+    for spec in args.backends:
+        loaded = load_spec(spec)
+        for bias in (False, True) if args.bias else (False,):
+            report = benchmark_backend(spec, clips, bias=bias, loaded=loaded)
+            reports.append(report)
+            print(f"{report['backend']:<32}{report['load_seconds']:>8.1f}{report['rtf']:>8.3f}"
+                  f"{report['mean_latency']:>11.2f}{report['accuracy']:>10.1%}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+COMMANDS_CSV = "data/benchmark_commands.csv"
+CORPUS_DIR = "data/benchmark_corpus"
+
+# Corpus variations: recorder sample rates, background noise and trailing silence
+SAMPLE_RATES = (16000, 44100, 48000)
+SNR_DB = (None, 20, 10)             # None = clean
+TRAILING_SILENCE_S = (0.2, 2.0)     # 2.0 s is the recorder's pause_threshold
+SEED = 1234
+
+
+# ---------------------------------------------------------------------------
+# Corpus generation
+# ---------------------------------------------------------------------------
+
+def synthesize(text, sr):
+    """Speak `text` with espeak-ng and return float32 samples at `sr`"""
+    import librosa
+
+    with tempfile.NamedTemporaryFile(suffix=".wav") as fp:
+        subprocess.run(["espeak-ng", "-s", "150", "-w", fp.name, text], check=True)
+        y, native_sr = sf.read(fp.name, dtype="float32")
+    if native_sr != sr:
+        y = librosa.resample(y, orig_sr=native_sr, target_sr=sr)
+    return y.astype(np.float32)
+
+
+def add_noise(y, snr_db, rng):
+    """Mix in white noise at the given signal-to-noise ratio"""
+    signal_power = np.mean(y ** 2)
+    noise_power = signal_power / (10 ** (snr_db / 10))
+    return (y + rng.normal(0, np.sqrt(noise_power), len(y))).astype(np.float32)
+
+
+def generate_corpus(commands_csv=COMMANDS_CSV, out_dir=CORPUS_DIR, seed=SEED):
+    """Render every command phrase in every variation and write manifest.csv"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    with open(commands_csv, newline="") as f:
+        commands = list(csv.DictReader(f))
+
+    rows = []
+    for i, command in enumerate(commands):
+        for sr in SAMPLE_RATES:
+            speech = synthesize(command["text"], sr)
+            for snr in SNR_DB:
+                for silence in TRAILING_SILENCE_S:
+                    y = np.concatenate([
+                        np.zeros(int(0.3 * sr), dtype=np.float32),
+                        speech,
+                        np.zeros(int(silence * sr), dtype=np.float32),
+                    ])
+                    if snr is not None:
+                        y = add_noise(y, snr, rng)
+                    name = f"{i:03d}_{sr}_{'clean' if snr is None else f'snr{snr}'}_{silence}s.wav"
+                    sf.write(os.path.join(out_dir, name), y, sr, subtype="PCM_16")
+                    rows.append({
+                        "path": name,
+                        "expected": command["expected"],
+                        "text": command["text"],
+                        "sr": sr,
+                        "snr_db": "" if snr is None else snr,
+                        "duration": round(len(y) / sr, 3),
+                    })
+
+    with open(os.path.join(out_dir, "manifest.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return len(rows)
+
+
+# ---------------------------------------------------------------------------
+# Running the benchmark
+# ---------------------------------------------------------------------------
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def stage_report(latencies, audio_seconds, correct=None):
+    """Throughput and latency percentiles for one stage"""
+    latencies = np.array(latencies) * 1000
+    total = latencies.sum() / 1000
+    report = {
+        "runs": len(latencies),
+        "clips_per_second": len(latencies) / total if total else None,
+        "audio_seconds_per_second": audio_seconds / total if total else None,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "mean_ms": float(latencies.mean()),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if correct is not None:
+        report["accuracy"] = sum(correct) / len(correct)
+    return report
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_benchmark(manifest, repeat=1, limit=None):
+    """Time preprocessing, ASR, command parsing and the full pipeline separately"""
+    import audio_to_text
+    from asr_backends import ASR_ENGINE, ASR_MODEL_SIZE, ASR_COMPUTE_TYPE
+
+    root = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, newline="") as f:
+        clips = list(csv.DictReader(f))[:limit]
+    for clip in clips:
+        clip["audio"], clip["sr"] = sf.read(os.path.join(root, clip["path"]), dtype="float32")
+        clip["seconds"] = len(clip["audio"]) / clip["sr"]
+
+    rss_start = peak_rss_mb()
+    start = time.perf_counter()
+    audio_to_text.get_models()
+    load_seconds = time.perf_counter() - start
+    audio_seconds = sum(c["seconds"] for c in clips) * repeat
+
+    def matches(command, clip):
+        return command.strip().lower() == clip["expected"].strip().lower()
+
+    # Stage by stage, on the output of the previous stage
+    latencies = []
+    for _ in range(repeat):
+        for clip in clips:
+            (clip["processed"], _), elapsed = timed(audio_to_text.preprocess_audio, clip["audio"], clip["sr"])
+            latencies.append(elapsed)
+    stages = {"preprocess_audio": stage_report(latencies, audio_seconds)}
+
+    latencies = []
+    for _ in range(repeat):
+        for clip in clips:
+            clip["transcript"], elapsed = timed(audio_to_text.transcribe_audio, clip["processed"])
+            latencies.append(elapsed)
+    stages["transcribe_audio"] = stage_report(latencies, audio_seconds)
+
+    latencies, correct = [], []
+    for _ in range(repeat):
+        for clip in clips:
+            command, elapsed = timed(audio_to_text.text_to_command, clip["transcript"])
+            latencies.append(elapsed)
+            correct.append(matches(command, clip))
+    stages["text_to_command"] = stage_report(latencies, audio_seconds, correct)
+
+    latencies, correct, failures = [], [], []
+    for _ in range(repeat):
+        for clip in clips:
+            result, elapsed = timed(audio_to_text.process_audio_detailed,
+                                    clip["audio"], clip["sr"], use_cache=False)
+            latencies.append(elapsed)
+            correct.append(matches(result["command"], clip))
+            if not correct[-1]:
+                failures.append({"path": clip["path"], "expected": clip["expected"],
+                                 "command": result["command"], "transcript": result["transcript"]})
+    stages["end_to_end"] = stage_report(latencies, audio_seconds, correct)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "cpus": os.cpu_count(),
+            "asr": f"{ASR_ENGINE}:{ASR_MODEL_SIZE}:{ASR_COMPUTE_TYPE}",
+            "spacy": audio_to_text.SPACY_MODEL,
+            "manifest": manifest,
+            "clips": len(clips),
+            "repeat": repeat,
+        },
+        "model_load_seconds": load_seconds,
+        "model_rss_mb": peak_rss_mb() - rss_start,
+        "stages": stages,
+        "failures": failures,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report):
+    meta = report["meta"]
+    print(f"{meta['clips']} clips x {meta['repeat']}, ASR {meta['asr']}, spaCy {meta['spacy']}, "
+          f"models loaded in {report['model_load_seconds']:.1f}s")
+    print(f"{'stage':<18}{'clips/s':>9}{'xRT':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'RSS MB':>8}{'acc':>7}")
+    for name, stage in report["stages"].items():
+        accuracy = f"{stage['accuracy']:.0%}" if "accuracy" in stage else ""
+        print(f"{name:<18}{stage['clips_per_second']:>9.2f}{stage['audio_seconds_per_second']:>8.1f}"
+              f"{stage['p50_ms']:>9.1f}{stage['p95_ms']:>9.1f}{stage['p99_ms']:>9.1f}"
+              f"{stage['peak_rss_mb']:>8.0f}{accuracy:>7}")
+
+
+def compare(baseline_path, current_path, max_regression=0.10):
+    """Print per-stage changes between two runs, return False on a regression"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    ok = True
+    print(f"{'stage':<18}{'metric':<10}{'baseline':>10}{'current':>10}{'change':>9}")
+    for name, stage in current["stages"].items():
+        old = baseline["stages"].get(name)
+        if not old:
+            continue
+        for metric in ("p50_ms", "p95_ms", "accuracy"):
+            if metric not in stage or metric not in old:
+                continue
+            change = (stage[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+            worse = change > max_regression if metric.endswith("_ms") else stage[metric] < old[metric]
+            ok &= not worse
+            print(f"{name:<18}{metric:<10}{old[metric]:>10.2f}{stage[metric]:>10.2f}"
+                  f"{change:>+9.1%}{'  REGRESSION' if worse else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audio-to-command benchmark suite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="synthesize the clip corpus (needs espeak-ng)")
+    generate.add_argument("--commands", default=COMMANDS_CSV)
+    generate.add_argument("--out", default=CORPUS_DIR)
+    generate.add_argument("--seed", type=int, default=SEED)
+
+    run = commands.add_parser("run", help="benchmark the pipeline on a corpus")
+    run.add_argument("--manifest", default=os.path.join(CORPUS_DIR, "manifest.csv"))
+    run.add_argument("--repeat", type=int, default=1)
+    run.add_argument("--limit", type=int, help="only use the first N clips")
+    run.add_argument("-o", "--output", help="write the results as JSON")
+
+    cmp = commands.add_parser("compare", help="compare two result files")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--max-regression", type=float, default=0.10,
+                     help="allowed relative latency increase (default 10%%)")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        count = generate_corpus(args.commands, args.out, args.seed)
+        print(f"Wrote {count} clips to {args.out}")
+    elif args.command == "run":
+        report = run_benchmark(args.manifest, args.repeat, args.limit)
+        print_report(report)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+    else:
+        sys.exit(0 if compare(args.baseline, args.current, args.max_regression) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from latency import span
+
+# Seconds a single network step (geocode, route, Overpass query) may take
+STEP_DEADLINE = float(os.environ.get("COMMAND_STEP_DEADLINE", "15"))
+# Threads for the blocking calls; a step that missed its deadline keeps one busy until it returns
+COMMAND_WORKERS = int(os.environ.get("COMMAND_WORKERS", "16"))
+
+
+class StepFailed(Exception):
+    """A step of a command raised or missed its deadline"""
+
+
+class Job:
+    """One command running on the executor; its progress can be read from any thread"""
+
+    def __init__(self, key, command):
+        self.key = key
+        self.command = command
+        self.submitted = time.perf_counter()
+        self.applied = False  # set by the UI once the result is shown
+        self._steps = {}
+        self._lock = threading.Lock()
+        self._future = None
+
+    def _set(self, name, state, seconds=None):
+        with self._lock:
+            self._steps[name] = (state, seconds)
+
+    def progress(self):
+        """[(step, state, seconds or None)] in the order the steps started"""
+        with self._lock:
+            return [(name, state, seconds) for name, (state, seconds) in self._steps.items()]
+
+    def done(self):
+        return self._future.done()
+
+    def cancelled(self):
+        return self._future.cancelled()
+
+    def cancel(self):
+        """Stop the command; steps already in a worker thread finish but are ignored"""
+        return self._future.cancel()
+
+    def wait(self, timeout=None):
+        """Block until the command is done or `timeout` seconds passed; True if done"""
+        return bool(wait([self._future], timeout).done)
+
+    def result(self, timeout=None):
+        return self._future.result(timeout)
+
+    async def step(self, name, fn, *args, deadline=STEP_DEADLINE):
+        """Run the blocking `fn(*args)` in a worker thread, within `deadline` seconds"""
+        self._set(name, "running")
+        start = time.perf_counter()
+        try:
+            with span(f"command.{name}"):
+                result = await asyncio.wait_for(asyncio.to_thread(fn, *args), deadline)
+        except asyncio.TimeoutError:
+            self._set(name, "timed out", time.perf_counter() - start)
+            raise StepFailed(f"{name} timed out after {deadline:g}s") from None
+        except asyncio.CancelledError:
+            self._set(name, "cancelled", time.perf_counter() - start)
+            raise
+        except Exception as e:
+            self._set(name, "failed", time.perf_counter() - start)
+            raise StepFailed(str(e)) from e
+        self._set(name, "done", time.perf_counter() - start)
+        return result
+
+
+class CommandExecutor:
+    """Runs commands as coroutines on an event loop in a background thread
+
+    Each session (`key`) has at most one command in flight: submitting a new
+    one cancels the previous one, so a late result can never overwrite a
+    newer command. The blocking network calls run in a thread pool, which
+    lets independent steps of one command run concurrently.
+    """
+
+    def __init__(self, workers=COMMAND_WORKERS):
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(workers, thread_name_prefix="command"))
+        self._current = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self.loop.run_forever, name="command-executor", daemon=True).start()
+
+    def submit(self, key, command, run):
+        """Start the coroutine `run(job)` for `command`, cancelling the session's previous one"""
+        job = Job(key, command)
+        with self._lock:
+            previous = self._current.get(key)
+            job._future = asyncio.run_coroutine_threadsafe(self._run(job, run), self.loop)
+            self._current[key] = job
+        if previous is not None:
+            previous.cancel()
+        return job
+
+    def cancel(self, key):
+        """Cancel the command in flight for `key`, if any"""
+        with self._lock:
+            job = self._current.get(key)
+        return job.cancel() if job is not None else False
+
+    async def _run(self, job, run):
+        try:
+            return await run(job)
+        finally:
+            with self._lock:
+                if self._current.get(job.key) is job:
+                    del self._current[job.key]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process-wide CommandExecutor shared by all Streamlit sessions"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = CommandExecutor()
+    return _executor
+
@@ -0,0 +1,54 @@
+import re
+
+# Map control commands to the phrases that trigger them. Order is priority:
+# when a transcript contains several commands the earliest entry wins.
+# Add synonyms here; they are compiled into one regex at import time.
+COMMAND_SYNONYMS = {
+    "satellite": ["satellite", "aerial", "bird's eye"],
+    "road layer": ["road layer", "street map", "road view"],
+    "zoom in": ["zoom in", "magnify", "enlarge"],
+    "zoom out": ["zoom out", "minimize", "shrink"],
+}
+
+# "national highway 44", "NH 48", "nh-27" -> NH44 / NH48 / NH27 (lowest priority)
+NH_PATTERN = r"(?:national\s+highway|nh)\s*-?\s*(?P<nh>\d+)"
+
+
+def _phrase_pattern(phrase):
+    """Regex for a phrase with flexible whitespace between its words"""
+    return r"\s+".join(re.escape(word) for word in phrase.split())
+
+
+def compile_grammar(synonyms=COMMAND_SYNONYMS, nh_pattern=NH_PATTERN):
+    """Build a single matcher for all command synonyms and the NH pattern
+
+    Returns (regex, commands) where the named group `c<i>` of the regex
+    corresponds to commands[i].
+    """
+    commands = list(synonyms)
+    alternatives = [
+        rf"(?P<c{i}>\b(?:{'|'.join(_phrase_pattern(p) for p in synonyms[command])})\b)"
+        for i, command in enumerate(commands)
+    ]
+    alternatives.append(rf"\b{nh_pattern}\b")
+    return re.compile("|".join(alternatives), re.IGNORECASE), commands
+
+
+COMMAND_REGEX, COMMANDS = compile_grammar()
+
+
+def match_command(text, grammar=None):
+    """Return the control/NH command in `text`, or None if there is none"""
+    regex, commands = grammar or (COMMAND_REGEX, COMMANDS)
+    best, best_rank = None, len(commands) + 1
+    for match in regex.finditer(text):
+        if match.group("nh") is not None:
+            rank, command = len(commands), f"NH{match.group('nh')}"
+        else:
+            rank = int(match.lastgroup[1:])
+            command = commands[rank]
+        if rank < best_rank:
+            best, best_rank = command, rank
+            if rank == 0:
+                break
+    return best
@@ -0,0 +1,236 @@
+import argparse
+import csv
+import io
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+import zipfile
+from collections import namedtuple
+from functools import lru_cache
+
+GAZETTEER_DB = os.environ.get("GAZETTEER_DB", "data/gazetteer.sqlite")
+GEONAMES_DUMP_URL = "https://download.geonames.org/export/dump/{}.zip"
+
+# GeoNames feature classes kept by default: populated places and admin divisions
+FEATURE_CLASSES = "PA"
+
+Place = namedtuple(
+    "Place", "id name admin1 admin2 country feature_code population lat lon"
+)
+
+csv.field_size_limit(sys.maxsize)
+
+
+def normalize_name(name):
+    """Lookup key for a place name: no accents, lower case, single spaces"""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return re.sub(r"[^\w]+", " ", name.casefold()).strip()
+
+
+# ---------------------------------------------------------------------------
+# Building the index
+# ---------------------------------------------------------------------------
+
+def read_admin_codes(path):
+    """Map GeoNames admin codes (e.g. 'IN.07') to names"""
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {row[0]: row[1] for row in csv.reader(f, delimiter="\t") if len(row) > 1}
+
+
+def read_geonames(path, admin1_names, admin2_names, feature_classes=FEATURE_CLASSES):
+    """Yield (Place, alternate names) from a GeoNames dump (IN.txt, cities500.txt...)"""
+    with open(path, encoding="utf-8") as f:
+        for row in csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE):
+            if len(row) < 15 or row[6] not in feature_classes:
+                continue
+            country, admin1, admin2 = row[8], row[10], row[11]
+            place = Place(
+                id=int(row[0]),
+                name=row[1],
+                admin1=admin1_names.get(f"{country}.{admin1}", admin1),
+                admin2=admin2_names.get(f"{country}.{admin1}.{admin2}", admin2),
+                country=country,
+                feature_code=row[7],
+                population=int(row[14] or 0),
+                lat=float(row[4]),
+                lon=float(row[5]),
+            )
+            yield place, [row[2]] + row[3].split(",")
+
+
+def read_places_csv(path):
+    """Yield (Place, alternate names) from a CSV export (e.g. OSM place nodes)
+
+    Columns: name, latitude, longitude and optionally alternatenames
+    (separated by '|' or ';'), admin1, admin2, country, population, feature_code.
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        for i, row in enumerate(csv.DictReader(f), 1):
+            place = Place(
+                id=int(row.get("id") or i),
+                name=row["name"],
+                admin1=row.get("admin1", ""),
+                admin2=row.get("admin2", ""),
+                country=row.get("country", ""),
+                feature_code=row.get("feature_code", ""),
+                population=int(float(row.get("population") or 0)),
+                lat=float(row["latitude"]),
+                lon=float(row["longitude"]),
+            )
+            yield place, re.split(r"[|;]", row.get("alternatenames") or "")
+
+
+def build_index(records, db_path=GAZETTEER_DB):
+    """Write places and all their normalized names into a fresh SQLite index"""
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+    db = sqlite3.connect(tmp_path)
+    db.executescript("""
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        CREATE TABLE places (
+            id INTEGER PRIMARY KEY, name TEXT, admin1 TEXT, admin2 TEXT, country TEXT,
+            feature_code TEXT, population INTEGER, lat REAL, lon REAL
+        );
+        CREATE TABLE names (
+            key TEXT, place_id INTEGER, PRIMARY KEY (key, place_id)
+        ) WITHOUT ROWID;
+    """)
+    count = 0
+    for place, alternate_names in records:
+        db.execute("INSERT OR REPLACE INTO places VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", place)
+        keys = {normalize_name(n) for n in [place.name, *alternate_names]} - {""}
+        db.executemany("INSERT OR IGNORE INTO names VALUES (?, ?)", [(k, place.id) for k in keys])
+        count += 1
+    db.commit()
+    db.execute("VACUUM")
+    db.close()
+    os.replace(tmp_path, db_path)
+    return count
+
+
+def download_geonames(country="IN", directory="data"):
+    """Download and unpack the GeoNames dump for a country, return the .txt path"""
+    import requests
+
+    response = requests.get(GEONAMES_DUMP_URL.format(country), timeout=120)
+    response.raise_for_status()
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        archive.extract(f"{country}.txt", directory)
+    return os.path.join(directory, f"{country}.txt")
+
+
+# ---------------------------------------------------------------------------
+# Lookups
+# ---------------------------------------------------------------------------
+
+class Gazetteer:
+    """Read-only, memory-mapped place index built by `build_index`"""
+
+    def __init__(self, db_path=GAZETTEER_DB):
+        self.db_path = db_path
+        self._db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self._db.execute("PRAGMA mmap_size = 1073741824")
+        self._lock = threading.Lock()
+        # Repeated names are answered from memory without touching SQLite
+        self.lookup = lru_cache(maxsize=65536)(self._lookup)
+
+    def _lookup(self, name, limit=5):
+        """Places whose name or alternate name is `name`, most populous first"""
+        with self._lock:
+            rows = self._db.execute(
+                """SELECT p.* FROM names n JOIN places p ON p.id = n.place_id
+                   WHERE n.key = ? ORDER BY p.population DESC LIMIT ?""",
+                (normalize_name(name), limit),
+            ).fetchall()
+        return tuple(Place(*row) for row in rows)
+
+    def best(self, name):
+        """The most populous place called `name`, or None"""
+        matches = self.lookup(name, 1)
+        return matches[0] if matches else None
+
+    def __contains__(self, name):
+        return self.best(name) is not None
+
+    def places(self, min_population=0):
+        """Iterate over all places (used to build other indexes)"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM places WHERE population >= ? ORDER BY population DESC",
+                (min_population,),
+            ).fetchall()
+        return [Place(*row) for row in rows]
+
+    def names(self):
+        """Iterate over (normalized name, place id) pairs"""
+        with self._lock:
+            return self._db.execute("SELECT key, place_id FROM names").fetchall()
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Shared Gazetteer instance, or None when no index has been built"""
+    global _gazetteer
+    if _gazetteer is None and os.path.exists(GAZETTEER_DB):
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer(GAZETTEER_DB)
+    return _gazetteer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline place-name index")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="build the index from a GeoNames dump or CSV")
+    build.add_argument("source", nargs="?", help="GeoNames .txt dump or places .csv")
+    build.add_argument("--download", metavar="COUNTRY",
+                       help="download the GeoNames dump for COUNTRY (e.g. IN) first")
+    build.add_argument("--admin1", help="GeoNames admin1CodesASCII.txt")
+    build.add_argument("--admin2", help="GeoNames admin2Codes.txt")
+    build.add_argument("--feature-classes", default=FEATURE_CLASSES)
+    build.add_argument("-o", "--output", default=GAZETTEER_DB)
+
+    lookup = commands.add_parser("lookup", help="look up a place name")
+    lookup.add_argument("name")
+    lookup.add_argument("--db", default=GAZETTEER_DB)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        source = download_geonames(args.download) if args.download else args.source
+        if not source:
+            parser.error("give a source file or --download COUNTRY")
+        if source.endswith(".csv"):
+            records = read_places_csv(source)
+        else:
+            records = read_geonames(source, read_admin_codes(args.admin1),
+                                    read_admin_codes(args.admin2), args.feature_classes)
+        start = time.perf_counter()
+        count = build_index(records, args.output)
+        print(f"Indexed {count} places into {args.output} in {time.perf_counter() - start:.1f}s")
+    else:
+        gazetteer = Gazetteer(args.db)
+        start = time.perf_counter()
+        matches = gazetteer.lookup(args.name)
+        print(f"{len(matches)} matches in {(time.perf_counter() - start) * 1e6:.0f} µs")
+        for place in matches:
+            print(f"  {place.name}, {place.admin2}, {place.admin1} ({place.population}) "
+                  f"{place.lat:.4f}, {place.lon:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from gazetteer import get_gazetteer, normalize_name
+from latency import span
+from ttl_cache import TTLCache
+
+GEOCODE_CACHE_DB = os.environ.get("GEOCODE_CACHE_DB", "data/geocode_cache.sqlite")
+# Found places are kept for 30 days, unknown names for a day
+GEOCODE_TTL = float(os.environ.get("GEOCODE_TTL", str(30 * 24 * 3600)))
+GEOCODE_NEGATIVE_TTL = float(os.environ.get("GEOCODE_NEGATIVE_TTL", str(24 * 3600)))
+NOMINATIM_USER_AGENT = os.environ.get("NOMINATIM_USER_AGENT", "geo_command")
+# Nominatim usage policy: at most one request per second per application
+NOMINATIM_MIN_INTERVAL = float(os.environ.get("NOMINATIM_MIN_INTERVAL", "1.0"))
+NOMINATIM_TIMEOUT = float(os.environ.get("NOMINATIM_TIMEOUT", "5"))
+
+
+class RateLimiter:
+    """Space calls at least `min_interval` seconds apart across threads"""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.min_interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class DiskCache:
+    """Geocoding results in SQLite, shared by every process on the machine"""
+
+    def __init__(self, path=GEOCODE_CACHE_DB):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS geocode (
+                   key TEXT PRIMARY KEY, lat REAL, lon REAL, expires REAL
+               ) WITHOUT ROWID"""
+        )
+        self._lock = threading.Lock()
+
+    def lookup(self, key):
+        """Return (True, (lat, lon) or None) for a live entry, (False, None) otherwise"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT lat, lon FROM geocode WHERE key = ? AND expires > ?", (key, time.time())
+            ).fetchone()
+        if row is None:
+            return False, None
+        return True, None if row[0] is None else (row[0], row[1])
+
+    def put(self, key, location, ttl):
+        lat, lon = location if location else (None, None)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?)", (key, lat, lon, time.time() + ttl)
+            )
+
+
+class Geocoder:
+    """City name -> (lat, lon), trying the cheapest source first
+
+    Memory (LRU with TTL) -> offline gazetteer -> SQLite cache -> Nominatim.
+    Network lookups are rate limited, and concurrent requests for the same
+    name (from any session) share a single Nominatim call.
+    """
+
+    def __init__(self, country_codes="in", disk_path=GEOCODE_CACHE_DB):
+        from geopy.geocoders import Nominatim
+
+        self.country_codes = country_codes
+        self.countries = {code.strip().upper() for code in country_codes.split(",") if code.strip()}
+        self.memory = TTLCache(max_entries=4096, ttl=GEOCODE_TTL, negative_ttl=GEOCODE_NEGATIVE_TTL)
+        self.disk = DiskCache(disk_path) if disk_path else None
+        self.nominatim = Nominatim(user_agent=NOMINATIM_USER_AGENT, timeout=NOMINATIM_TIMEOUT)
+        self.limiter = RateLimiter(NOMINATIM_MIN_INTERVAL)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _in_countries(self, place):
+        """Gazetteer places abroad fall through to the next tier; CSV exports may have no country"""
+        return not place.country or place.country.upper() in self.countries
+
+    def _key(self, name):
+        return f"{self.country_codes}|{normalize_name(name)}"
+
+    def geocode(self, name):
+        """(lat, lon) of `name`, or None if it cannot be found"""
+        key = self._key(name)
+        found, location = self.memory.lookup(key)
+        if found:
+            return location
+
+        gazetteer = get_gazetteer()
+        if gazetteer:
+            with span("geocode.gazetteer"):
+                place = next((p for p in gazetteer.lookup(name) if self._in_countries(p)), None)
+            if place:
+                location = (place.lat, place.lon)
+                self.memory.put(key, location)
+                return location
+
+        if self.disk:
+            with span("geocode.disk"):
+                found, location = self.disk.lookup(key)
+            if found:
+                self.memory.put(key, location)
+                return location
+
+        return self._single_flight(key, name)
+
+    def _single_flight(self, key, name):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result()[1]
+
+        try:
+            ok, location = self._nominatim(name)
+            # Service errors are not cached, the next request tries again
+            if ok:
+                self.memory.put(key, location)
+                if self.disk:
+                    self.disk.put(key, location, GEOCODE_TTL if location else GEOCODE_NEGATIVE_TTL)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result((ok, location))
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return location
+
+    def _nominatim(self, name):
+        """(True, location or None) from Nominatim, (False, None) if the service failed"""
+        from geopy.exc import GeopyError
+
+        self.limiter.wait()
+        try:
+            with span("geocode.nominatim"):
+                result = self.nominatim.geocode(name, country_codes=self.country_codes)
+        except GeopyError as e:
+            print(f"Nominatim lookup for {name!r} failed: {e}")
+            return False, None
+        return True, (result.latitude, result.longitude) if result else None
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def get_geocoder():
+    """Process-wide Geocoder shared by all Streamlit sessions"""
+    global _geocoder
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None:
+                _geocoder = Geocoder()
+    return _geocoder
+
+
+def geocode(name):
+    """(lat, lon) of a city in India, or None"""
+    return get_geocoder().geocode(name)
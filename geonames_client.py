@@ -0,0 +1,111 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from latency import span
+from ttl_cache import TTLCache
+
+GEONAMES_URL = os.environ.get("GEONAMES_URL", "http://api.geonames.org/searchJSON")
+GEONAMES_USERNAME = os.environ.get("GEONAMES_USERNAME", "demo")  # Replace 'demo' with your GeoNames username
+# (connect, read) timeout of one request, in seconds
+GEONAMES_TIMEOUT = (
+    float(os.environ.get("GEONAMES_CONNECT_TIMEOUT", "2")),
+    float(os.environ.get("GEONAMES_READ_TIMEOUT", "3")),
+)
+# Parallel lookups, also the size of the connection pool
+GEONAMES_WORKERS = int(os.environ.get("GEONAMES_WORKERS", "8"))
+
+# Resolved names are kept for a day, unknown names for an hour
+geonames_cache = TTLCache(
+    max_entries=int(os.environ.get("GEONAMES_CACHE_SIZE", "4096")),
+    ttl=float(os.environ.get("GEONAMES_CACHE_TTL", str(24 * 3600))),
+    negative_ttl=float(os.environ.get("GEONAMES_NEGATIVE_TTL", "3600")),
+)
+
+
+class GeoNamesError(RuntimeError):
+    """Raised when GeoNames answers with an error instead of results"""
+
+
+_session = None
+_executor = None
+_init_lock = threading.Lock()
+
+
+def get_session():
+    """Shared keep-alive session, so lookups reuse open connections"""
+    global _session
+    if _session is None:
+        with _init_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=2,
+                    pool_maxsize=GEONAMES_WORKERS,
+                    max_retries=Retry(total=1, backoff_factor=0.2, status_forcelist=(502, 503, 504)),
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(GEONAMES_WORKERS, thread_name_prefix="geonames")
+    return _executor
+
+
+def _search(place_name, timeout):
+    response = get_session().get(
+        GEONAMES_URL,
+        params={"q": place_name, "maxRows": 1, "username": GEONAMES_USERNAME},
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    data = response.json()
+    # Quota and authentication errors come back as HTTP 200 with a status object
+    if "status" in data:
+        raise GeoNamesError(data["status"].get("message", "unknown error"))
+    return data["geonames"][0]["name"] if data.get("geonames") else None
+
+
+def query_geonames(place_name, timeout=GEONAMES_TIMEOUT):
+    """Query GeoNames API for better place name resolution"""
+    key = place_name.strip().lower()
+    found, name = geonames_cache.lookup(key)
+    if found:
+        return name
+    try:
+        with span("geonames"):
+            name = _search(place_name, timeout)
+    except (requests.RequestException, ValueError, KeyError, GeoNamesError) as e:
+        # Not cached, the next request tries again
+        print(f"GeoNames lookup for {place_name!r} failed: {e}")
+        return None
+    geonames_cache.put(key, name)
+    return name
+
+
+def resolve_places(place_names, timeout=GEONAMES_TIMEOUT):
+    """Resolve several names concurrently, {name: resolved name or None}
+
+    All lookups run at once on the pooled session, so an utterance with
+    several unknown places waits for one round trip instead of one per place.
+    """
+    place_names = list(dict.fromkeys(place_names))
+    if len(place_names) <= 1:
+        return {name: query_geonames(name, timeout) for name in place_names}
+
+    executor = get_executor()
+    futures = {name: executor.submit(query_geonames, name, timeout) for name in place_names}
+    # Connect plus read timeout bounds every lookup; a little slack for queueing
+    wait(futures.values(), timeout=sum(timeout) + 1 if isinstance(timeout, tuple) else timeout + 1)
+    return {name: future.result() if future.done() else None for name, future in futures.items()}
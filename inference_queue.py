@@ -0,0 +1,123 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from latency import recorder
+
+# Requests waiting for the ASR model before new ones are turned away
+INFERENCE_QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", "16"))
+# Threads running decodes; each one drives the shared model
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))
+# Clips arriving within this window are decoded together, up to the batch size
+INFERENCE_BATCH_WINDOW = float(os.environ.get("INFERENCE_BATCH_WINDOW", "0.05"))
+INFERENCE_MAX_BATCH = int(os.environ.get("INFERENCE_MAX_BATCH", "4"))
+# Default time a caller waits for its transcript, queueing included
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", "30"))
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised when the inference queue is full"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a transcript is not ready before the request's deadline"""
+
+
+class _Request:
+    __slots__ = ("audio", "deadline", "enqueued", "future")
+
+    def __init__(self, audio, deadline):
+        self.audio = audio
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+        self.future = Future()
+
+
+class InferenceScheduler:
+    """Bounded queue in front of the ASR model with dynamic batching
+
+    `transcribe_batch` takes a list of clips and returns their transcripts.
+    Workers take the first waiting request, collect whatever else arrives
+    within `batch_window` (up to `max_batch`), drop requests whose deadline
+    already passed and decode the rest in one call.
+    """
+
+    def __init__(self, transcribe_batch, max_queue=INFERENCE_QUEUE_SIZE, workers=INFERENCE_WORKERS,
+                 max_batch=INFERENCE_MAX_BATCH, batch_window=INFERENCE_BATCH_WINDOW,
+                 timeout=INFERENCE_TIMEOUT):
+        self.transcribe_batch = transcribe_batch
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._workers = [
+            threading.Thread(target=self._run, name=f"asr-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, audio, timeout=None):
+        """Queue a clip and return a Future for its transcript"""
+        request = _Request(audio, time.monotonic() + (timeout or self.timeout))
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            raise SchedulerBusy(
+                f"Speech recognizer is busy ({self._queue.maxsize} requests waiting), try again shortly"
+            ) from None
+        return request.future
+
+    def transcribe(self, audio, timeout=None):
+        """Transcribe one clip, waiting at most `timeout` seconds"""
+        timeout = timeout or self.timeout
+        future = self.submit(audio, timeout)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise DeadlineExceeded(f"No transcript within {timeout:g}s") from None
+
+    def pending(self):
+        """Number of requests waiting for a worker"""
+        return self._queue.qsize()
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        window_end = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = window_end - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            now = time.monotonic()
+            live = []
+            for request in batch:
+                if not request.future.set_running_or_notify_cancel():
+                    continue  # the caller already gave up
+                if request.deadline <= now:
+                    request.future.set_exception(DeadlineExceeded("Request expired while queued"))
+                else:
+                    recorder.record("asr.queue_wait", now - request.enqueued)
+                    live.append(request)
+            if not live:
+                continue
+
+            try:
+                texts = self.transcribe_batch([request.audio for request in live])
+            except Exception as e:
+                for request in live:
+                    request.future.set_exception(e)
+            else:
+                for request, text in zip(live, texts):
+                    request.future.set_result(text)
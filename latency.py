@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Append every span as a JSON line to this file when set
+LATENCY_LOG = os.environ.get("LATENCY_LOG")
+# Samples kept per stage for the percentiles
+LATENCY_WINDOW = int(os.environ.get("LATENCY_WINDOW", "1000"))
+
+
+class LatencyRecorder:
+    """Collect per-stage timings and summarize them as p50/p95/p99"""
+
+    def __init__(self, window=LATENCY_WINDOW, log_path=LATENCY_LOG):
+        self.window = window
+        self.log_path = log_path
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """Add one measurement for `stage`"""
+        with self._lock:
+            self._samples[stage].append(seconds)
+            self._counts[stage] += 1
+            if self.log_path:
+                with open(self.log_path, "a") as f:
+                    f.write(json.dumps({"time": time.time(), "stage": stage,
+                                        "ms": round(seconds * 1000, 3)}) + "\n")
+
+    @contextmanager
+    def span(self, stage, timings=None):
+        """Time the enclosed block as `stage`, also adding it to the `timings` dict"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.record(stage, elapsed)
+            if timings is not None:
+                timings[stage] = timings.get(stage, 0.0) + elapsed
+
+    def summary(self):
+        """{stage: {count, mean, p50, p95, p99, max}} in milliseconds"""
+        with self._lock:
+            samples = {stage: np.array(values) * 1000 for stage, values in self._samples.items()}
+            counts = dict(self._counts)
+        result = {}
+        for stage, values in samples.items():
+            if not len(values):
+                continue
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            result[stage] = {
+                "count": counts[stage],
+                "mean": float(values.mean()),
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99),
+                "max": float(values.max()),
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+
+# Process-wide recorder used by the voice pipeline and the Streamlit app
+recorder = LatencyRecorder()
+span = recorder.span
+
+
+def format_summary(summary):
+    """Plain-text table of a summary, slowest stages first"""
+    lines = [f"{'stage':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for stage, stats in sorted(summary.items(), key=lambda item: -item[1]["p50"]):
+        lines.append(f"{stage:<24}{stats['count']:>7}{stats['p50']:>10.1f}"
+                     f"{stats['p95']:>10.1f}{stats['p99']:>10.1f}")
+    return "\n".join(lines)
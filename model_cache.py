@@ -0,0 +1,143 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+
+import numpy as np
+
+# Prepared models live here; processes load them lazily and share the pages
+MODEL_CACHE_DIR = os.environ.get("MODEL_CACHE_DIR", "models")
+
+
+def whisper_path(size, directory=MODEL_CACHE_DIR):
+    return os.path.join(directory, f"whisper-{size}.pt")
+
+
+def faster_whisper_path(size, directory=MODEL_CACHE_DIR):
+    return os.path.join(directory, f"faster-whisper-{size}")
+
+
+def spacy_path(name, directory=MODEL_CACHE_DIR):
+    return os.path.join(directory, f"spacy-{name}")
+
+
+# ---------------------------------------------------------------------------
+# Preparing
+# ---------------------------------------------------------------------------
+
+def prepare_whisper(size, directory=MODEL_CACHE_DIR):
+    """Store the fp32 CPU weights so they can be memory-mapped as they are
+
+    The published checkpoints are fp16 and have to be converted on every
+    load; this file holds exactly the tensors the model uses on the CPU.
+    """
+    import torch
+    import whisper
+
+    model = whisper.load_model(size, device="cpu")
+    state = {name: tensor.contiguous() for name, tensor in model.state_dict().items()}
+    path = whisper_path(size, directory)
+    os.makedirs(directory, exist_ok=True)
+    torch.save({"dims": asdict(model.dims), "model_state_dict": state}, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def prepare_faster_whisper(size, directory=MODEL_CACHE_DIR):
+    """Download the CTranslate2 model so startup never checks the Hugging Face hub"""
+    from faster_whisper import download_model
+
+    return download_model(size, output_dir=faster_whisper_path(size, directory))
+
+
+def prepare_spacy(mode, directory=MODEL_CACHE_DIR):
+    """Save the pipeline for `mode` with only the components it uses"""
+    from nlp_modes import build_nlp, describe_nlp
+
+    path = spacy_path(describe_nlp(mode), directory)
+    build_nlp(mode).to_disk(path)
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+
+def load_whisper(path, size, device=None):
+    """Build a Whisper model around memory-mapped weights from `prepare_whisper`
+
+    The model is created on the meta device (no allocation, no random init)
+    and the mapped tensors are assigned to it without a copy, so the weights
+    are only read from disk when they are used and are shared through the
+    page cache by every process that loads the same file.
+    """
+    import torch
+    import whisper
+    from whisper.model import ModelDimensions, Whisper
+
+    checkpoint = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    dims = ModelDimensions(**checkpoint["dims"])
+    with torch.device("meta"):
+        model = Whisper(dims)
+    model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+
+    # Buffers that are not part of the checkpoint
+    n_ctx = dims.n_text_ctx
+    model.decoder.register_buffer(
+        "mask", torch.empty(n_ctx, n_ctx).fill_(-np.inf).triu_(1), persistent=False
+    )
+    heads = torch.zeros(dims.n_text_layer, dims.n_text_head, dtype=torch.bool)
+    heads[dims.n_text_layer // 2:] = True
+    model.register_buffer("alignment_heads", heads.to_sparse(), persistent=False)
+    if size in whisper._ALIGNMENT_HEADS:
+        model.set_alignment_heads(whisper._ALIGNMENT_HEADS[size])
+
+    if any(t.is_meta for t in [*model.parameters(), *model.buffers()]):
+        raise RuntimeError(f"{path} does not match this Whisper version, run model_cache.py again")
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    return model.to(device)
+
+
+def cold_start_seconds():
+    """Time to load the configured models in a fresh interpreter"""
+    code = ("import time; start = time.perf_counter(); import audio_to_text; "
+            "audio_to_text.get_models(); print(time.perf_counter() - start)")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    from asr_backends import ASR_ENGINE, ASR_MODEL_SIZE
+    from nlp_modes import NLP_MODE
+
+    parser = argparse.ArgumentParser(description="Convert models once into the local model cache")
+    parser.add_argument("--asr", nargs="*", default=[f"{ASR_ENGINE}:{ASR_MODEL_SIZE}"],
+                        help="engine:size, e.g. whisper:large faster-whisper:small")
+    parser.add_argument("--nlp", nargs="*", default=[NLP_MODE], help="NLP modes (trf, sm, lean...)")
+    parser.add_argument("--time", action="store_true",
+                        help="measure the restart-to-ready time before and after")
+    args = parser.parse_args()
+
+    if args.time:
+        print(f"Cold start before: {cold_start_seconds():.1f}s")
+    for spec in args.asr:
+        engine, _, size = spec.partition(":")
+        start = time.perf_counter()
+        if engine == "whisper":
+            path = prepare_whisper(size or ASR_MODEL_SIZE)
+        elif engine == "faster-whisper":
+            path = prepare_faster_whisper(size or ASR_MODEL_SIZE)
+        else:
+            parser.error(f"unknown ASR engine '{engine}'")
+        print(f"{spec} -> {path} ({time.perf_counter() - start:.1f}s)")
+    for mode in args.nlp:
+        start = time.perf_counter()
+        print(f"spaCy {mode} -> {prepare_spacy(mode)} ({time.perf_counter() - start:.1f}s)")
+    if args.time:
+        print(f"Cold start after: {cold_start_seconds():.1f}s")
+
+
+if __name__ == "__main__":
+    main()
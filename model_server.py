@@ -0,0 +1,241 @@
+import os
+import argparse
+import ipaddress
+import secrets
+import stat
+import threading
+from multiprocessing.connection import Listener, Client, AuthenticationError
+
+# Where the shared model server listens (local machine only by default)
+SERVER_ADDRESS = (
+    os.environ.get("MODEL_SERVER_HOST", "127.0.0.1"),
+    int(os.environ.get("MODEL_SERVER_PORT", "6123")),
+)
+# Requests are pickled, so the key must stay secret: without MODEL_SERVER_AUTHKEY
+# the server generates a random one into a file only this user can read
+SERVER_AUTHKEY = os.environ.get("MODEL_SERVER_AUTHKEY")
+SERVER_KEY_FILE = os.environ.get(
+    "MODEL_SERVER_KEY_FILE", os.path.join(os.path.expanduser("~"), ".cache", "geo_command", "model_server.key")
+)
+
+# "auto": use the server if it is running, otherwise load models in-process
+# "required": always use the server and fail if it is down
+# "off": never use the server
+SERVER_MODE = os.environ.get("MODEL_SERVER_MODE", "auto")
+REQUEST_TIMEOUT = float(os.environ.get("MODEL_SERVER_TIMEOUT", "60"))
+
+
+class ModelServerError(RuntimeError):
+    """Raised when the model server is unreachable or a request fails"""
+
+
+class ModelServerUnavailable(ModelServerError):
+    """Raised when no model server is listening"""
+
+
+class ModelServerBusy(ModelServerError):
+    """Raised when the model server's inference queue is full"""
+
+
+def read_key_file(path=SERVER_KEY_FILE):
+    """The generated key, or None if the server never created one"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    with os.fdopen(fd, "rb") as f:
+        if stat.S_IMODE(os.fstat(f.fileno()).st_mode) & 0o077:
+            raise ModelServerError(f"{path} is readable by other users, remove it and restart the server")
+        return f.read().strip()
+
+
+def create_key_file(path=SERVER_KEY_FILE):
+    """Read the generated key, creating it (mode 0600) on first use"""
+    key = read_key_file(path)
+    if key:
+        return key
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    key = secrets.token_hex(32).encode()
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return read_key_file(path)  # another server created it first
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Server side
+# ---------------------------------------------------------------------------
+
+def warm_up():
+    """Run one dummy inference so the first real request is not slow"""
+    import numpy as np
+    import audio_to_text
+    from place_matcher import get_place_matcher
+
+    get_place_matcher()  # builds or loads the fuzzy place index
+    _, nlp = audio_to_text.get_models()
+    audio_to_text.transcribe_audio(np.zeros(audio_to_text.TARGET_SR, dtype=np.float32))
+    nlp("Show me the route from Delhi to Jaipur")
+
+
+def _process_audio_bytes(audio_bytes):
+    """Run the local pipeline on recorder bytes, entirely in memory"""
+    import audio_to_text
+
+    return audio_to_text.process_audio(audio_bytes)
+
+
+def handle_request(request):
+    """Dispatch one request to the loaded models"""
+    import audio_to_text
+
+    op = request.get("op")
+    if op == "ping":
+        return "pong"
+    if op == "process_audio":
+        return _process_audio_bytes(request["audio"])
+    if op == "text_to_command":
+        return audio_to_text.text_to_command(request["text"])
+    if op == "cache_stats":
+        return audio_to_text.transcript_cache.stats()
+    if op == "latency_stats":
+        from latency import recorder
+        return recorder.summary()
+    raise ValueError(f"Unknown operation: {op}")
+
+
+def serve_connection(conn):
+    """Answer requests on one client connection until it is closed"""
+    from inference_queue import SchedulerBusy
+
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                break
+            try:
+                # Connections run concurrently; the inference queue serializes and
+                # batches access to the ASR model
+                response = {"ok": True, "result": handle_request(request)}
+            except SchedulerBusy as e:
+                response = {"ok": False, "busy": True, "error": str(e)}
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            try:
+                conn.send(response)
+            except (BrokenPipeError, OSError):
+                # Client gave up (timeout) before we finished
+                break
+
+
+def serve(address=SERVER_ADDRESS, authkey=None):
+    """Load the models once, warm them up and serve requests forever"""
+    authkey = authkey or (SERVER_AUTHKEY.encode() if SERVER_AUTHKEY else None)
+    if authkey is None:
+        if not is_loopback(address[0]):
+            raise SystemExit(f"Refusing to listen on {address[0]} without MODEL_SERVER_AUTHKEY")
+        authkey = create_key_file()
+
+    import audio_to_text
+
+    print("Loading models...")
+    audio_to_text.get_models()
+    warm_up()
+
+    with Listener(address, authkey=authkey) as listener:
+        print(f"Model server listening on {address[0]}:{address[1]}")
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError) as e:
+                print(f"Rejected connection: {e}")
+                continue
+            threading.Thread(target=serve_connection, args=(conn,), daemon=True).start()
+
+
+# ---------------------------------------------------------------------------
+# Client side
+# ---------------------------------------------------------------------------
+
+def call(op, timeout=REQUEST_TIMEOUT, address=SERVER_ADDRESS, authkey=None, **payload):
+    """Send one request to the model server and wait up to `timeout` seconds"""
+    authkey = authkey or (SERVER_AUTHKEY.encode() if SERVER_AUTHKEY else read_key_file())
+    if authkey is None:
+        raise ModelServerUnavailable(f"No MODEL_SERVER_AUTHKEY and no key at {SERVER_KEY_FILE}, "
+                                     "the model server has not been started")
+    try:
+        conn = Client(address, authkey=authkey)
+    except (ConnectionRefusedError, FileNotFoundError) as e:
+        raise ModelServerUnavailable(f"Model server not running at {address[0]}:{address[1]}") from e
+    with conn:
+        conn.send({"op": op, **payload})
+        if not conn.poll(timeout):
+            raise ModelServerError(f"Model server did not answer '{op}' within {timeout:.0f}s")
+        response = conn.recv()
+    if not response["ok"]:
+        if response.get("busy"):
+            raise ModelServerBusy(response["error"])
+        raise ModelServerError(response["error"])
+    return response["result"]
+
+
+def _call_or_local(op, local, timeout, **payload):
+    """Use the server according to SERVER_MODE, falling back to `local`"""
+    if SERVER_MODE != "off":
+        try:
+            return call(op, timeout=timeout, **payload)
+        except ModelServerUnavailable:
+            if SERVER_MODE == "required":
+                raise
+    return local()
+
+
+def process_audio(audio_bytes, timeout=REQUEST_TIMEOUT):
+    """Turn recorder bytes into a command using the shared models"""
+    return _call_or_local(
+        "process_audio", lambda: _process_audio_bytes(audio_bytes), timeout, audio=audio_bytes
+    )
+
+
+def text_to_command(text, timeout=REQUEST_TIMEOUT):
+    """Turn transcribed text into a command using the shared models"""
+    def local():
+        import audio_to_text
+        return audio_to_text.text_to_command(text)
+
+    return _call_or_local("text_to_command", local, timeout, text=text)
+
+
+def latency_summary(timeout=5):
+    """Stage latencies measured inside the model server, or None if it is not running"""
+    if SERVER_MODE == "off":
+        return None
+    try:
+        return call("latency_stats", timeout=timeout)
+    except ModelServerError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared Whisper/spaCy model server")
+    parser.add_argument("--host", default=SERVER_ADDRESS[0])
+    parser.add_argument("--port", type=int, default=SERVER_ADDRESS[1])
+    args = parser.parse_args()
+    serve((args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,9 @@ import numpy as np
 import scipy.signal as signal
 import spacy
 import re
-import requests
+from gazetteer import get_gazetteer
+from place_matcher import get_place_matcher
+from geonames_client import resolve_places
 
 # Load models once
 def load_models():
@@ -21,18 +23,6 @@ model, nlp = load_models()
 GAZETTEER = {"smallville", "rivertown", "hilltop", "springfield"}  # Example locations
 
 
-def query_geonames(place_name):
-    """Query GeoNames API for better place name resolution"""
-    url = f"http://api.geonames.org/searchJSON?q={place_name}&maxRows=1&username=demo"  # Replace 'demo' with your GeoNames username
-    try:
-        response = requests.get(url)
-        data = response.json()
-        if data["geonames"]:
-            return data["geonames"][0]["name"]
-    except:
-        pass
-    return None
-
 
 def preprocess_audio(input_path):
     """Audio preprocessing pipeline"""
@@ -66,12 +56,28 @@ def extract_geopolitical_entities(text):
     doc = nlp(text)
     entities = {ent.text.lower() for ent in doc.ents if ent.label_ == "GPE"}
     
-    # Check against gazetteer
-    validated_entities = {place for place in entities if place in GAZETTEER}
+    # Check against the offline gazetteer (or the example set when no index is built)
+    gazetteer = get_gazetteer()
+    matcher = get_place_matcher()
+    if not entities and matcher:
+        # NER missed them, look for (misspelled) place names in the text itself
+        return [match.label.lower() for match in matcher.find_places(text)]
+
+    validated_entities = set()
+    unresolved = set()
+    for place in entities:
+        if gazetteer and (match := gazetteer.best(place)):
+            validated_entities.add(match.name.lower())
+        elif matcher and (fuzzy := matcher.best(place)):
+            # Near-miss spelling from the recognizer
+            validated_entities.add(fuzzy.label.lower())
+        elif place in GAZETTEER:
+            validated_entities.add(place)
+        else:
+            unresolved.add(place)
     
-    # Query GeoNames for missing places
-    for place in entities - validated_entities:
-        resolved_name = query_geonames(place)
+    # Query GeoNames for missing places, all at once
+    for resolved_name in resolve_places(unresolved).values():
         if resolved_name:
             validated_entities.add(resolved_name.lower())
     
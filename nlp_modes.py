@@ -0,0 +1,201 @@
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import spacy
+from spacy.language import Language
+from spacy.util import filter_spans
+
+from latency import span
+from model_cache import spacy_path
+
+# "lean" (tokenizer + gazetteer rules), or a spaCy model / alias for the statistical NER
+NLP_MODE = os.environ.get("NLP_MODE", "trf")
+NLP_MODELS = {
+    "trf": "en_core_web_trf",
+    "lg": "en_core_web_lg",
+    "sm": "en_core_web_sm",
+}
+# Statistical model used by lean mode when the rules find no place ("" to never use one)
+NLP_FALLBACK_MODEL = os.environ.get("NLP_FALLBACK_MODEL", "en_core_web_sm")
+# Plain-text file with one place name per line; the gazetteer is used when unset
+NLP_PLACE_NAMES = os.environ.get("NLP_PLACE_NAMES")
+# Smallest gazetteer place whose names become rules
+NLP_RULER_MIN_POPULATION = int(os.environ.get("NLP_RULER_MIN_POPULATION", "5000"))
+
+# Only the NER is needed to pull out GPE entities
+UNUSED_COMPONENTS = ["tagger", "parser", "attribute_ruler", "lemmatizer", "senter", "morphologizer"]
+
+COMMANDS_CSV = "data/benchmark_commands.csv"
+
+
+def load_statistical(model):
+    """Load a spaCy package with only the components its NER depends on"""
+    return spacy.load(NLP_MODELS.get(model, model), exclude=UNUSED_COMPONENTS)
+
+
+def place_names(path=NLP_PLACE_NAMES, min_population=NLP_RULER_MIN_POPULATION):
+    """Names for the rule-based matcher, from `path` or the offline gazetteer"""
+    from place_matcher import STOPWORDS
+
+    if path:
+        with open(path, encoding="utf-8") as f:
+            names = {line.strip() for line in f}
+    else:
+        from gazetteer import get_gazetteer
+
+        gazetteer = get_gazetteer()
+        if gazetteer is None:
+            return []
+        places = {place.id: place for place in gazetteer.places(min_population)}
+        names = {place.name for place in places.values()}
+        names.update(key for key, place_id in gazetteer.names() if place_id in places)
+    # Very short names and command words would match almost every utterance
+    return sorted(n for n in names if len(n) > 2 and n.lower() not in STOPWORDS)
+
+
+class GPEFallback:
+    """Run a statistical NER model on docs in which the rules found no place
+
+    The model is loaded the first time it is needed, so commands covered by
+    the gazetteer never pay for it.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._nlp = None
+        self._lock = threading.Lock()
+
+    def __call__(self, doc):
+        if not self.model or any(ent.label_ == "GPE" for ent in doc.ents):
+            return doc
+        with self._lock:
+            if self._nlp is None:
+                self._nlp = load_statistical(self.model)
+            with span("ner.fallback"):
+                found = self._nlp(doc.text).ents
+        spans = [
+            doc.char_span(ent.start_char, ent.end_char, label="GPE", alignment_mode="expand")
+            for ent in found if ent.label_ == "GPE"
+        ]
+        doc.ents = filter_spans(list(doc.ents) + [s for s in spans if s is not None])
+        return doc
+
+
+@Language.factory("gpe_fallback", default_config={"model": NLP_FALLBACK_MODEL})
+def create_gpe_fallback(nlp, name, model):
+    return GPEFallback(model)
+
+
+def load_lean(names=None, fallback=NLP_FALLBACK_MODEL):
+    """Tokenizer plus a case-insensitive phrase ruler tagging known places as GPE"""
+    nlp = spacy.blank("en")
+    ruler = nlp.add_pipe("entity_ruler", config={"phrase_matcher_attr": "LOWER"})
+    names = place_names() if names is None else names
+    ruler.add_patterns([{"label": "GPE", "pattern": name} for name in names])
+    nlp.add_pipe("gpe_fallback", config={"model": fallback})
+    return nlp
+
+
+def build_nlp(mode=NLP_MODE):
+    """Assemble the spaCy pipeline for `mode` from the installed packages"""
+    if mode == "lean":
+        return load_lean()
+    return load_statistical(mode)
+
+
+def _prepared_is_fresh(path, mode):
+    config = os.path.join(path, "config.cfg")
+    if not os.path.exists(config):
+        return False
+    if mode != "lean":
+        return True
+    # Lean rules are built from the place list, rebuild them when it changes
+    from gazetteer import GAZETTEER_DB
+
+    source = NLP_PLACE_NAMES or GAZETTEER_DB
+    return not os.path.exists(source) or os.path.getmtime(source) <= os.path.getmtime(config)
+
+
+def load_nlp(mode=NLP_MODE):
+    """Load the spaCy pipeline for `mode`, from the model cache when it was prepared"""
+    path = spacy_path(describe_nlp(mode))
+    if _prepared_is_fresh(path, mode):
+        return spacy.load(path)
+    return build_nlp(mode)
+
+
+def describe_nlp(mode=NLP_MODE):
+    """Short name of the pipeline, for reports and cache keys"""
+    if mode == "lean":
+        return f"lean+{NLP_FALLBACK_MODEL or 'rules'}"
+    return NLP_MODELS.get(mode, mode)
+
+
+# ---------------------------------------------------------------------------
+# Load time and memory report
+# ---------------------------------------------------------------------------
+
+def measure(mode, commands_csv=COMMANDS_CSV):
+    """Load `mode` in this process and time it on the benchmark phrases"""
+    from benchmark_pipeline import peak_rss_mb
+    from command_grammar import match_command
+
+    with open(commands_csv, newline="") as f:
+        rows = [row for row in csv.DictReader(f) if not match_command(row["text"])]
+
+    rss_start = peak_rss_mb()
+    start = time.perf_counter()
+    nlp = load_nlp(mode)
+    load_seconds = time.perf_counter() - start
+    nlp("warm up")
+
+    correct, start = 0, time.perf_counter()
+    for row in rows:
+        places = [ent.text for ent in nlp(row["text"]).ents if ent.label_ == "GPE"]
+        expected = "" if row["expected"] == "No valid command" else row["expected"]
+        correct += " ".join(places).lower() == expected.lower()
+    return {
+        "mode": describe_nlp(mode),
+        "load_seconds": load_seconds,
+        "rss_mb": peak_rss_mb() - rss_start,
+        "ms_per_text": (time.perf_counter() - start) * 1000 / len(rows),
+        "accuracy": correct / len(rows),
+        "components": nlp.pipe_names,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare NLP modes: load time, memory and place accuracy")
+    parser.add_argument("modes", nargs="*", default=["lean", "sm", "trf"])
+    parser.add_argument("--commands", default=COMMANDS_CSV)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.modes[0], args.commands)))
+        return
+
+    print(f"{'mode':<26}{'load s':>8}{'RSS MB':>8}{'ms/text':>9}{'acc':>6}  components")
+    for mode in args.modes:
+        # A fresh interpreter per mode, so memory and load time are not shared
+        result = subprocess.run(
+            [sys.executable, __file__, "--child", "--commands", args.commands, mode],
+            capture_output=True, text=True,
+        )
+        if result.returncode:
+            error = result.stderr.strip().splitlines() or [f"exit code {result.returncode}"]
+            print(f"{mode:<26}failed: {error[-1]}")
+            continue
+        r = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{r['mode']:<26}{r['load_seconds']:>8.2f}{r['rss_mb']:>8.0f}{r['ms_per_text']:>9.2f}"
+              f"{r['accuracy']:>6.0%}  {', '.join(r['components'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+import argparse
+import heapq
+import math
+import os
+import threading
+import time
+from array import array
+
+import numpy as np
+
+from reverse_geocoder import EARTH_RADIUS_KM, to_xyz
+
+try:
+    from numba import njit
+except ImportError:  # the search still works, but runs as plain Python
+    njit = None
+
+# Prepared graph, one .npy file per array so everything can be memory-mapped
+ROUTER_DIR = os.environ.get("ROUTER_DIR", "data/router")
+ROUTER_LANDMARKS = int(os.environ.get("ROUTER_LANDMARKS", "16"))
+# Landmarks used per query: the ones giving the best bound between start and end
+ACTIVE_LANDMARKS = int(os.environ.get("ROUTER_ACTIVE_LANDMARKS", "4"))
+# Start/end points farther than this from any road are not routed
+MAX_SNAP_KM = 5.0
+INDIA_EXTRACT_URL = "https://download.geofabrik.de/asia/india-latest.osm.pbf"
+
+# Assumed driving speeds (km/h) when a way has no usable maxspeed tag
+SPEEDS_KMH = {
+    "motorway": 100, "motorway_link": 60,
+    "trunk": 80, "trunk_link": 50,
+    "primary": 60, "primary_link": 40,
+    "secondary": 50, "secondary_link": 35,
+    "tertiary": 40, "tertiary_link": 30,
+    "unclassified": 30, "road": 30, "residential": 25,
+    "living_street": 10, "service": 15,
+}
+NO_ACCESS = {"no", "private"}
+
+ARRAYS = (
+    "indptr", "targets", "times", "lengths", "geom_start", "geom_end", "geom_reversed",
+    "node_lat", "node_lon", "shape_lat", "shape_lon", "landmarks", "from_landmarks", "to_landmarks",
+    "rev_indptr", "rev_sources", "rev_edges",
+)
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * 1000 * np.arcsin(np.sqrt(a))
+
+
+# ---------------------------------------------------------------------------
+# Building the graph
+# ---------------------------------------------------------------------------
+
+def parse_speed(tags):
+    """Speed in km/h from maxspeed, or the default for the highway type"""
+    value = tags.get("maxspeed", "")
+    try:
+        if value.endswith("mph"):
+            return float(value[:-3]) * 1.609
+        return float(value)
+    except ValueError:
+        return SPEEDS_KMH[tags["highway"]]
+
+
+def parse_oneway(tags):
+    """1 = only along the way, -1 = only against it, 0 = both directions"""
+    oneway = tags.get("oneway", "")
+    if oneway == "-1":
+        return -1
+    if oneway in ("yes", "1", "true") or tags.get("junction") == "roundabout":
+        return 1
+    if oneway == "no":
+        return 0
+    return 1 if tags["highway"] in ("motorway", "motorway_link") else 0
+
+
+def read_ways(pbf_path):
+    """Drivable ways from an OSM extract as flat arrays (needs pyosmium)"""
+    import osmium
+
+    class WayCollector(osmium.SimpleHandler):
+        def __init__(self):
+            super().__init__()
+            self.refs, self.lats, self.lons, self.way_of = array("q"), array("f"), array("f"), array("i")
+            self.speeds, self.oneway = array("f"), array("b")
+
+        def way(self, w):
+            tags = w.tags
+            if tags.get("highway") not in SPEEDS_KMH:
+                return
+            if tags.get("access") in NO_ACCESS or tags.get("motor_vehicle") in NO_ACCESS:
+                return
+            try:
+                nodes = [(n.ref, n.location.lat, n.location.lon) for n in w.nodes]
+            except osmium.InvalidLocationError:
+                return  # clipped at the extract boundary
+            if len(nodes) < 2:
+                return
+            way = len(self.speeds)
+            self.speeds.append(parse_speed(tags))
+            self.oneway.append(parse_oneway(tags))
+            for ref, lat, lon in nodes:
+                self.refs.append(ref)
+                self.lats.append(lat)
+                self.lons.append(lon)
+                self.way_of.append(way)
+
+    collector = WayCollector()
+    collector.apply_file(pbf_path, locations=True, idx="flex_mem")
+    return (
+        np.frombuffer(collector.refs, dtype=np.int64),
+        np.frombuffer(collector.lats, dtype=np.float32),
+        np.frombuffer(collector.lons, dtype=np.float32),
+        np.frombuffer(collector.way_of, dtype=np.int32),
+        np.frombuffer(collector.speeds, dtype=np.float32),
+        np.frombuffer(collector.oneway, dtype=np.int8),
+    )
+
+
+def build_graph(refs, lats, lons, way_of, speeds, oneway):
+    """Directed CSR graph whose nodes are the junctions and ends of the ways
+
+    Nodes in between become the shape points of the edges. Parallel edges
+    keep the fastest one, and only the largest strongly connected component
+    is kept so every snapped pair of points has a route.
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    n = len(refs)
+    first = np.ones(n, dtype=bool)
+    first[1:] = way_of[1:] != way_of[:-1]
+    last = np.ones(n, dtype=bool)
+    last[:-1] = first[1:]
+    _, inverse, counts = np.unique(refs, return_inverse=True, return_counts=True)
+    split = first | last | (counts[inverse] > 1)
+
+    # Cumulative length along the ways (segments across way boundaries are 0)
+    segments = haversine_m(lats[:-1], lons[:-1], lats[1:], lons[1:])
+    segments[last[:-1]] = 0
+    along = np.concatenate(([0.0], np.cumsum(segments)))
+
+    points = np.flatnonzero(split)
+    a, b = points[:-1], points[1:]
+    same_way = way_of[a] == way_of[b]
+    a, b = a[same_way], b[same_way]
+    length = along[b] - along[a]
+    way = way_of[a]
+    travel_time = np.maximum(length / (speeds[way] / 3.6), 0.01)
+
+    node_refs, node_of_point = np.unique(refs[points], return_inverse=True)
+    node_at = np.full(n, -1, dtype=np.int64)
+    node_at[points] = node_of_point
+    node_lat = np.empty(len(node_refs), dtype=np.float32)
+    node_lon = np.empty(len(node_refs), dtype=np.float32)
+    node_lat[node_of_point], node_lon[node_of_point] = lats[points], lons[points]
+
+    # Each way segment becomes up to two directed edges
+    forward, backward = oneway[way] != -1, oneway[way] != 1
+    u, v = node_at[a], node_at[b]
+    src = np.concatenate((u[forward], v[backward]))
+    dst = np.concatenate((v[forward], u[backward]))
+    edges = {
+        "times": np.concatenate((travel_time[forward], travel_time[backward])).astype(np.float32),
+        "lengths": np.concatenate((length[forward], length[backward])).astype(np.float32),
+        "geom_start": np.concatenate((a[forward], a[backward])),
+        "geom_end": np.concatenate((b[forward], b[backward])),
+        "geom_reversed": np.concatenate((np.zeros(forward.sum(), bool), np.ones(backward.sum(), bool))),
+    }
+
+    # Drop loops and keep the fastest of parallel edges
+    order = np.lexsort((edges["times"], dst, src))
+    order = order[src[order] != dst[order]]
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = (src[order][1:] != src[order][:-1]) | (dst[order][1:] != dst[order][:-1])
+    order = order[keep]
+    src, dst = src[order], dst[order]
+    edges = {name: values[order] for name, values in edges.items()}
+
+    # Largest strongly connected component only
+    nodes = len(node_refs)
+    matrix = csr_matrix((edges["times"], (src, dst)), shape=(nodes, nodes))
+    _, labels = connected_components(matrix, directed=True, connection="strong")
+    in_main = labels == np.bincount(labels).argmax()
+    new_id = np.cumsum(in_main) - 1
+    kept = in_main[src] & in_main[dst]
+    src, dst = new_id[src[kept]], new_id[dst[kept]]
+    edges = {name: values[kept] for name, values in edges.items()}
+
+    order = np.argsort(src, kind="stable")
+    graph = {name: values[order] for name, values in edges.items()}
+    graph["targets"] = dst[order].astype(np.int32)
+    graph["indptr"] = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=in_main.sum()))))
+    graph["node_lat"], graph["node_lon"] = node_lat[in_main], node_lon[in_main]
+    graph["shape_lat"], graph["shape_lon"] = lats, lons
+    graph.update(reverse_graph(graph["indptr"], graph["targets"]))
+    return graph
+
+
+def reverse_graph(indptr, targets):
+    """Incoming edges per node, for the backward half of the search"""
+    sources = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+    order = np.argsort(targets, kind="stable")
+    counts = np.bincount(targets, minlength=len(indptr) - 1)
+    return {
+        "rev_indptr": np.concatenate(([0], np.cumsum(counts))),
+        "rev_sources": sources[order],
+        "rev_edges": order.astype(np.int64),
+    }
+
+
+def select_landmarks(graph, count=ROUTER_LANDMARKS, seed=0):
+    """Farthest-point landmarks and the travel times from and to each of them (ALT)"""
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra
+
+    nodes = len(graph["indptr"]) - 1
+    matrix = csr_matrix((graph["times"], graph["targets"], graph["indptr"]), shape=(nodes, nodes))
+    reverse = matrix.T.tocsr()
+
+    start = int(np.random.default_rng(seed).integers(nodes))
+    landmarks = [int(np.argmax(dijkstra(matrix, indices=start)))]
+    while len(landmarks) < count:
+        # The node farthest from every landmark chosen so far
+        nearest = dijkstra(matrix, indices=landmarks, min_only=True)
+        landmarks.append(int(np.argmax(nearest)))
+
+    from_landmarks = np.empty((nodes, count), dtype=np.float32)
+    to_landmarks = np.empty((nodes, count), dtype=np.float32)
+    for i, landmark in enumerate(landmarks):
+        from_landmarks[:, i] = dijkstra(matrix, indices=landmark)
+        to_landmarks[:, i] = dijkstra(reverse, indices=landmark)
+    graph["landmarks"] = np.array(landmarks, dtype=np.int64)
+    graph["from_landmarks"], graph["to_landmarks"] = from_landmarks, to_landmarks
+    return graph
+
+
+def build_router(pbf_path, directory=ROUTER_DIR, landmarks=ROUTER_LANDMARKS):
+    """Build the graph and landmarks from an OSM extract and store them"""
+    start = time.perf_counter()
+    graph = build_graph(*read_ways(pbf_path))
+    print(f"Graph: {len(graph['indptr']) - 1} nodes, {len(graph['targets'])} edges "
+          f"({time.perf_counter() - start:.0f}s)")
+    start = time.perf_counter()
+    select_landmarks(graph, landmarks)
+    print(f"{landmarks} landmarks ({time.perf_counter() - start:.0f}s)")
+
+    os.makedirs(directory, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(directory, f"{name}.npy"), graph[name])
+    return directory
+
+
+# ---------------------------------------------------------------------------
+# Queries
+# ---------------------------------------------------------------------------
+
+def _bidirectional_alt(indptr, targets, times, rev_indptr, rev_sources, rev_edges,
+                      from_landmarks, to_landmarks, active, source, target,
+                      dist_f, dist_r, parent_f, parent_r, settled_f, settled_r):
+    """Bidirectional A* with the average landmark potential; returns (meeting node, cost)
+
+    Forward keys are d(s,v) + p(v) and backward keys d(v,t) - p(v), with
+    p(v) = (pi_t(v) - pi_s(v)) / 2 built from the landmark lower bounds, so
+    both searches see the same non-negative reduced costs and can stop as
+    soon as the two smallest keys add up to the best path found. The
+    per-query arrays are reused and only the entries touched are reset.
+    """
+    inf = math.inf
+    meet, best = -1, inf
+    touched = [source, target]
+    dist_f[source] = 0.0
+    dist_r[target] = 0.0
+
+    def potential(v):
+        to_t, from_s = 0.0, 0.0
+        for i in active:
+            to_t = max(to_t, from_landmarks[target, i] - from_landmarks[v, i],
+                       to_landmarks[v, i] - to_landmarks[target, i])
+            from_s = max(from_s, from_landmarks[v, i] - from_landmarks[source, i],
+                         to_landmarks[source, i] - to_landmarks[v, i])
+        # Slightly shrunk so float32 rounding never makes a bound overestimate
+        return 0.4995 * (to_t - from_s)
+
+    heap_f = [(potential(source), source)]
+    heap_r = [(-potential(target), target)]
+    while heap_f and heap_r:
+        if heap_f[0][0] + heap_r[0][0] >= best:
+            break
+        if heap_f[0][0] <= heap_r[0][0]:
+            _, u = heapq.heappop(heap_f)
+            if settled_f[u]:
+                continue
+            settled_f[u] = True
+            for e in range(indptr[u], indptr[u + 1]):
+                v = np.int64(targets[e])
+                cost = dist_f[u] + times[e]
+                if cost < dist_f[v]:
+                    if dist_f[v] == inf:
+                        touched.append(v)
+                    dist_f[v] = cost
+                    parent_f[v] = e
+                    heapq.heappush(heap_f, (cost + potential(v), v))
+                if cost + dist_r[v] < best:
+                    best, meet = cost + dist_r[v], v
+        else:
+            _, u = heapq.heappop(heap_r)
+            if settled_r[u]:
+                continue
+            settled_r[u] = True
+            for j in range(rev_indptr[u], rev_indptr[u + 1]):
+                v, e = np.int64(rev_sources[j]), rev_edges[j]
+                cost = dist_r[u] + times[e]
+                if cost < dist_r[v]:
+                    if dist_r[v] == inf:
+                        touched.append(v)
+                    dist_r[v] = cost
+                    parent_r[v] = e
+                    heapq.heappush(heap_r, (cost - potential(v), v))
+                if cost + dist_f[v] < best:
+                    best, meet = cost + dist_f[v], v
+
+    for v in touched:
+        dist_f[v] = inf
+        dist_r[v] = inf
+        settled_f[v] = False
+        settled_r[v] = False
+    return meet, best
+
+
+if njit is not None:
+    _bidirectional_alt = njit(cache=True)(_bidirectional_alt)
+
+
+class Router:
+    """Point-to-point driving routes with bidirectional ALT (A*, landmarks, triangle inequality)
+
+    The landmark distances give a lower bound on the remaining travel time
+    for every node, so both searches head towards each other instead of
+    growing circles around the start and the end like plain Dijkstra. With
+    numba the search is compiled; queries on one Router are serialized
+    because they share the search arrays.
+    """
+
+    def __init__(self, directory=ROUTER_DIR):
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+        self.nodes = len(self.indptr) - 1
+        self._tree = None
+        self._buffers = None
+        self._lock = threading.Lock()
+
+    @property
+    def tree(self):
+        """KD-tree over the nodes, built on the first snap"""
+        if self._tree is None:
+            from scipy.spatial import cKDTree
+
+            with self._lock:
+                if self._tree is None:
+                    self._tree = cKDTree(to_xyz(np.asarray(self.node_lat, dtype=np.float64),
+                                                np.asarray(self.node_lon, dtype=np.float64)))
+        return self._tree
+
+    def snap(self, lat, lon):
+        """Nearest graph node to (lat, lon), or None when no road is close"""
+        chord, node = self.tree.query(to_xyz(lat, lon))
+        if 2 * EARTH_RADIUS_KM * np.arcsin(min(chord / 2, 1.0)) > MAX_SNAP_KM:
+            return None
+        return int(node)
+
+    def _active_landmarks(self, source, target, count=ACTIVE_LANDMARKS):
+        """The landmarks with the tightest lower bound on d(source, target)"""
+        bound = np.maximum(self.from_landmarks[target] - self.from_landmarks[source],
+                           self.to_landmarks[source] - self.to_landmarks[target])
+        return np.argsort(-bound)[:count].astype(np.int64)
+
+    def shortest_path(self, source, target):
+        """Edge ids of the fastest path, or None"""
+        active = self._active_landmarks(source, target)
+        with self._lock:
+            if self._buffers is None:
+                n = self.nodes
+                self._buffers = (np.full(n, np.inf), np.full(n, np.inf),
+                                 np.full(n, -1, dtype=np.int64), np.full(n, -1, dtype=np.int64),
+                                 np.zeros(n, dtype=bool), np.zeros(n, dtype=bool))
+            dist_f, dist_r, parent_f, parent_r, settled_f, settled_r = self._buffers
+            graph = [np.asarray(getattr(self, name)) for name in (
+                "indptr", "targets", "times", "rev_indptr", "rev_sources", "rev_edges",
+                "from_landmarks", "to_landmarks")]
+            meet, _ = _bidirectional_alt(*graph, active, source, target,
+                                         dist_f, dist_r, parent_f, parent_r, settled_f, settled_r)
+            if meet < 0:
+                return None
+            # Parents stay valid until the next query; walk them out from the meeting node
+            forward, node = [], meet
+            while node != source:
+                edge = int(parent_f[node])
+                forward.append(edge)
+                node = int(np.searchsorted(self.indptr, edge, side="right")) - 1
+            backward, node = [], meet
+            while node != target:
+                edge = int(parent_r[node])
+                backward.append(edge)
+                node = int(self.targets[edge])
+        return forward[::-1] + backward
+
+    def path_coords(self, path):
+        """Shape points of consecutive edges as one (n, 2) array, without repeated junctions"""
+        path = np.asarray(path, dtype=np.int64)
+        start, end = np.asarray(self.geom_start)[path], np.asarray(self.geom_end)[path]
+        reverse = np.asarray(self.geom_reversed)[path]
+        counts = end - start + 1
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.where(np.repeat(reverse, counts),
+                             np.repeat(end, counts) - offsets, np.repeat(start, counts) + offsets)
+        # Every edge after the first starts at the junction where the previous one ended
+        keep = np.ones(len(positions), dtype=bool)
+        keep[(np.cumsum(counts) - counts)[1:]] = False
+        positions = positions[keep]
+        return np.column_stack((np.asarray(self.shape_lat)[positions],
+                                np.asarray(self.shape_lon)[positions])).astype(np.float64)
+
+    def route(self, start_coords, end_coords):
+        """((n, 2) array of lat, lon, distance in meters) like get_route, or (None, None)"""
+        source, target = self.snap(*start_coords), self.snap(*end_coords)
+        if source is None or target is None:
+            return None, None
+        if source == target:
+            # Both ends snap to one junction: the route is that single point
+            return np.array([[self.node_lat[source], self.node_lon[source]]], dtype=np.float64), 0.0
+        path = self.shortest_path(source, target)
+        if path is None:
+            return None, None
+        distance = float(np.sum(np.asarray(self.lengths)[path]))
+        return self.path_coords(path), distance
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Shared Router, or None when no graph has been built"""
+    global _router
+    if _router is None and os.path.exists(os.path.join(ROUTER_DIR, "indptr.npy")):
+        with _router_lock:
+            if _router is None:
+                _router = Router(ROUTER_DIR)
+    return _router
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline driving routes over an OSM road graph")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help=f"build the graph from an OSM .pbf ({INDIA_EXTRACT_URL})")
+    build.add_argument("pbf")
+    build.add_argument("--landmarks", type=int, default=ROUTER_LANDMARKS)
+    build.add_argument("--out", default=ROUTER_DIR)
+
+    route = commands.add_parser("route", help="route between two lat,lon points")
+    route.add_argument("start")
+    route.add_argument("end")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_router(args.pbf, args.out, args.landmarks)
+        return
+
+    start = time.perf_counter()
+    router = get_router()
+    if router is None:
+        parser.error(f"no graph in {ROUTER_DIR}, run the build command first")
+    print(f"Graph loaded in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    coords, distance = router.route(tuple(map(float, args.start.split(","))),
+                                    tuple(map(float, args.end.split(","))))
+    elapsed = (time.perf_counter() - start) * 1000
+    if coords is None:
+        print(f"No route ({elapsed:.1f} ms)")
+    else:
+        print(f"{distance / 1000:.1f} km, {len(coords)} points ({elapsed:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+import argparse
+import os
+import threading
+import time
+import zlib
+from array import array
+from collections import namedtuple
+
+import numpy as np
+
+from gazetteer import GAZETTEER_DB, get_gazetteer, normalize_name
+
+# SymSpell parameters: names are indexed by every variant of their first
+# PREFIX_LENGTH characters with up to MAX_DISTANCE characters deleted
+MAX_DISTANCE = 2
+PREFIX_LENGTH = 7
+# Bonus per order of magnitude of population, so a big city beats a village
+# at the same edit distance but never an exact match
+POPULATION_WEIGHT = 0.1
+# Only fairly large places are picked out of free text without NER support
+MIN_SCAN_POPULATION = 10000
+# In free text, shorter single words must match a name exactly ("later" is not Latur)
+MIN_FUZZY_SCAN_LENGTH = 7
+
+PLACE_MATCHER_CACHE = os.environ.get("PLACE_MATCHER_CACHE", "data/place_matcher.npz")
+
+# Words in voice commands that must never be read as place names
+STOPWORDS = {
+    "a", "an", "and", "at", "by", "city", "find", "for", "from", "go", "in", "me", "map",
+    "near", "of", "on", "please", "route", "show", "take", "the", "to", "town", "via",
+    "where", "is", "highway", "national", "road", "zoom", "out", "drive", "directions",
+}
+
+Match = namedtuple("Match", "label name distance population score")
+
+try:
+    from rapidfuzz.distance import OSA
+
+    def edit_distance(a, b, max_distance):
+        """Optimal string alignment distance, or max_distance + 1 if it is larger"""
+        return OSA.distance(a, b, score_cutoff=max_distance)
+except ImportError:
+    def edit_distance(a, b, max_distance):
+        """Optimal string alignment distance, or max_distance + 1 if it is larger
+
+        Bit-parallel algorithm (Hyyrö 2003): one pass over `b` with the
+        columns of the DP matrix packed into Python ints.
+        """
+        if abs(len(a) - len(b)) > max_distance:
+            return max_distance + 1
+        if not a:
+            return len(b)
+        mask, last = (1 << len(a)) - 1, 1 << (len(a) - 1)
+        pattern = {}
+        for i, c in enumerate(a):
+            pattern[c] = pattern.get(c, 0) | (1 << i)
+
+        vp, vn, d0, pm_prev = mask, 0, 0, 0
+        distance = len(a)
+        for c in b:
+            pm = pattern.get(c, 0)
+            transposition = (((~d0) & pm) << 1) & pm_prev
+            d0 = ((((pm & vp) + vp) ^ vp) | pm | vn | transposition) & mask
+            hp = (vn | ~(d0 | vp)) & mask
+            hn = d0 & vp
+            if hp & last:
+                distance += 1
+            elif hn & last:
+                distance -= 1
+            hp = ((hp << 1) | 1) & mask
+            hn = (hn << 1) & mask
+            vp = (hn | ~(d0 | hp)) & mask
+            vn = hp & d0
+            pm_prev = pm
+        return distance if distance <= max_distance else max_distance + 1
+
+def deletes(word, max_distance):
+    """All strings obtained by deleting up to `max_distance` characters from `word`"""
+    results = frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        results = results | frontier
+    return results
+
+
+def _hash(text):
+    return zlib.crc32(text.encode())
+
+
+_LETTER_BINS = np.full(256, 36, dtype=np.int64)
+_LETTER_BINS[np.frombuffer(b"abcdefghijklmnopqrstuvwxyz0123456789", dtype=np.uint8)] = np.arange(36)
+
+
+def letter_counts(names):
+    """Per-name histogram of a-z, 0-9 and everything else"""
+    # Non-ASCII characters become "?" (the "everything else" bin), one byte each
+    data = np.frombuffer("".join(names).encode("ascii", errors="replace"), dtype=np.uint8)
+    rows = np.repeat(np.arange(len(names)), [len(n) for n in names])
+    flat = np.bincount(rows * 37 + _LETTER_BINS[data], minlength=len(names) * 37)
+    return flat.reshape(len(names), 37).astype(np.uint8)
+
+
+def allowed_distance(name):
+    """Fewer typos are tolerated in short names"""
+    if len(name) <= 3:
+        return 0
+    if len(name) <= 6:
+        return 1
+    return MAX_DISTANCE
+
+
+class PlaceMatcher:
+    """Fuzzy place-name lookup with a SymSpell-style delete index
+
+    The index is two sorted NumPy arrays (crc32 of each delete variant and the
+    name it came from), so 500k names take ~100 MB and a lookup is a handful
+    of binary searches. Candidates are pruned with vectorized length and
+    letter-histogram bounds before the exact distance check. Hash collisions
+    only add candidates, they never hide a match.
+    """
+
+    def __init__(self, names, populations, labels=None, _index=None):
+        labels = names if labels is None else labels
+        if _index is None:
+            # Index each distinct Latin-script name once, for its most populous place
+            best = {}
+            for name, population, label in zip(names, populations, labels):
+                if name.isascii() and (name not in best or population > best[name][0]):
+                    best[name] = (population, label)
+            names = list(best)
+            populations = [best[name][0] for name in names]
+            labels = [best[name][1] for name in names]
+
+        self.names = list(names)
+        self.labels = list(labels)
+        self.populations = np.asarray(populations, dtype=np.int64)
+        self.log_populations = np.log10(1 + self.populations.astype(np.float64))
+        self.lengths = np.fromiter((len(n) for n in self.names), dtype=np.int32, count=len(self.names))
+        self.counts = letter_counts(self.names)
+        self.exact = {name: i for i, name in enumerate(self.names)}
+        self._hashes, self._ids = _index if _index is not None else self._build_index()
+
+    def _build_index(self):
+        hashes, ids = array("I"), array("I")
+        for i, name in enumerate(self.names):
+            for variant in deletes(name[:PREFIX_LENGTH], MAX_DISTANCE):
+                hashes.append(_hash(variant))
+                ids.append(i)
+        hashes = np.frombuffer(hashes, dtype=np.uint32)
+        ids = np.frombuffer(ids, dtype=np.uint32)
+        order = np.argsort(hashes, kind="stable")
+        return hashes[order], ids[order]
+
+    @classmethod
+    def from_gazetteer(cls, gazetteer):
+        """One entry per (normalized name, place), labelled with the place's main name"""
+        places = {place.id: place for place in gazetteer.places()}
+        names, labels, populations = [], [], []
+        for key, place_id in gazetteer.names():
+            place = places[place_id]
+            names.append(key)
+            labels.append(place.name)
+            populations.append(place.population)
+        return cls(names, populations, labels)
+
+    def save(self, path):
+        """Store the built index so the next start skips the build"""
+        # Several processes may build at once: write a private file, then swap it in
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                names=np.frombuffer("\n".join(self.names).encode(), dtype=np.uint8),
+                labels=np.frombuffer("\n".join(self.labels).encode(), dtype=np.uint8),
+                populations=self.populations,
+                hashes=self._hashes,
+                ids=self._ids,
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        names = data["names"].tobytes().decode().split("\n")
+        labels = data["labels"].tobytes().decode().split("\n")
+        return cls(names, data["populations"], labels, _index=(data["hashes"], data["ids"]))
+
+    def lookup(self, query, limit=5, max_distance=None, min_population=0):
+        """Best matching places for `query`, best first"""
+        name = normalize_name(query)
+        if not name:
+            return []
+        if max_distance is None:
+            max_distance = allowed_distance(name)
+        max_distance = min(max_distance, MAX_DISTANCE)
+
+        if max_distance == 0:
+            candidates = np.array([self.exact[name]] if name in self.exact else [], dtype=np.int64)
+        else:
+            keys = np.fromiter((_hash(v) for v in deletes(name[:PREFIX_LENGTH], max_distance)),
+                               dtype=np.uint32)
+            lo = np.searchsorted(self._hashes, keys, "left")
+            hi = np.searchsorted(self._hashes, keys, "right")
+            ranges = [self._ids[l:h] for l, h in zip(lo, hi) if h > l]
+            if not ranges:
+                return []
+            candidates = np.sort(np.concatenate(ranges))
+            candidates = candidates[np.concatenate(([True], candidates[1:] != candidates[:-1]))]
+        if min_population:
+            candidates = candidates[self.populations[candidates] >= min_population]
+
+        # Lower bounds on the distance: length difference, and half the letter
+        # histogram difference (each edit changes the histogram by at most 2)
+        query_counts = letter_counts([name])[0].astype(np.int16)
+        histogram = np.abs(self.counts[candidates] - query_counts).sum(axis=1)
+        lower = np.maximum(np.abs(self.lengths[candidates] - len(name)), (histogram + 1) // 2)
+        keep = lower <= max_distance
+        candidates = candidates[keep]
+        bounds = lower[keep] - POPULATION_WEIGHT * self.log_populations[candidates]
+
+        # Check the most promising candidates first and stop once no remaining
+        # candidate can beat the current top `limit` matches
+        best = {}
+        for j in np.argsort(bounds, kind="stable"):
+            if len(best) >= limit and bounds[j] >= sorted(m.score for m in best.values())[limit - 1]:
+                break
+            i = candidates[j]
+            distance = edit_distance(name, self.names[i], max_distance)
+            if distance > max_distance:
+                continue
+            score = distance - POPULATION_WEIGHT * self.log_populations[i]
+            label = self.labels[i]
+            # Several alternate names of one place can match, keep the best one
+            if label not in best or score < best[label].score:
+                best[label] = Match(label, self.names[i], distance, int(self.populations[i]), float(score))
+        return sorted(best.values(), key=lambda m: m.score)[:limit]
+
+    def best(self, query, **options):
+        """The single best match for `query`, or None"""
+        matches = self.lookup(query, limit=1, **options)
+        return matches[0] if matches else None
+
+    def scan(self, words, max_words=3):
+        """Non-overlapping (start, end, match) word spans that name places, in order"""
+        found = []
+        for n in range(max_words, 0, -1):
+            for i in range(len(words) - n + 1):
+                if words[i] in STOPWORDS or words[i + n - 1] in STOPWORDS:
+                    continue
+                query = " ".join(words[i:i + n])
+                exact_only = n == 1 and len(query) < MIN_FUZZY_SCAN_LENGTH
+                match = self.best(query, min_population=MIN_SCAN_POPULATION,
+                                  max_distance=0 if exact_only else None)
+                if match:
+                    found.append((match.score, i, i + n, match))
+
+        # Keep the best non-overlapping matches
+        chosen, used = [], set()
+        for score, start, end, match in sorted(found, key=lambda f: f[0]):
+            if used.isdisjoint(range(start, end)):
+                used.update(range(start, end))
+                chosen.append((start, end, match))
+        return sorted(chosen, key=lambda c: c[0])
+
+    def find_places(self, text, limit=2, max_words=3):
+        """Pick place names out of free text, in the order they are spoken"""
+        return [match for _, _, match in self.scan(normalize_name(text).split(), max_words)][:limit]
+
+    def resolve(self, text, entities):
+        """Correct NER entities to known place names, or find places NER missed"""
+        if not entities:
+            return [match.label for match in self.find_places(text)]
+        resolved = []
+        for entity in entities:
+            match = self.best(entity)
+            resolved.append(match.label if match else entity)
+        return resolved
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_place_matcher():
+    """Shared PlaceMatcher built from the gazetteer, or None without a gazetteer"""
+    global _matcher
+    if _matcher is not None:
+        return _matcher
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return None
+    with _matcher_lock:
+        if _matcher is None:
+            cache_is_fresh = (
+                os.path.exists(PLACE_MATCHER_CACHE)
+                and os.path.getmtime(PLACE_MATCHER_CACHE) >= os.path.getmtime(GAZETTEER_DB)
+            )
+            if cache_is_fresh:
+                _matcher = PlaceMatcher.load(PLACE_MATCHER_CACHE)
+            else:
+                _matcher = PlaceMatcher.from_gazetteer(gazetteer)
+                _matcher.save(PLACE_MATCHER_CACHE)
+    return _matcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzzy place-name lookup")
+    parser.add_argument("queries", nargs="+")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    matcher = get_place_matcher()
+    if matcher is None:
+        parser.error(f"no gazetteer at {GAZETTEER_DB}, build one with gazetteer.py first")
+    print(f"{len(matcher.names)} names ready in {time.perf_counter() - start:.1f}s")
+
+    for query in args.queries:
+        start = time.perf_counter()
+        matches = matcher.lookup(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{query!r} ({elapsed:.3f} ms):")
+        for match in matches:
+            print(f"  {match.label} (distance {match.distance}, population {match.population})")
+
+
+if __name__ == "__main__":
+    main()
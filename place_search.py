@@ -0,0 +1,133 @@
+import argparse
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+import numpy as np
+
+from gazetteer import GAZETTEER_DB, get_gazetteer, normalize_name
+
+# Completions kept ready for every prefix up to this length, where a prefix
+# matches too many names to rank them per keystroke
+PRECOMPUTED_PREFIX = 2
+PRECOMPUTED_K = 20
+
+Suggestion = namedtuple("Suggestion", "name matched admin2 admin1 country feature_code population lat lon")
+
+
+class PrefixIndex:
+    """Typeahead over place names: a sorted array of normalized names
+
+    All names starting with a prefix form one contiguous range, found with
+    two binary searches; the range is ranked by population with NumPy. For
+    one- and two-letter prefixes the top results are precomputed.
+    """
+
+    def __init__(self, keys, place_ids, places):
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in order]
+        self.places = places
+        self.place_ids = np.array([place_ids[i] for i in order], dtype=np.int64)
+        self.populations = np.array([places[pid].population for pid in self.place_ids], dtype=np.int64)
+        self._top = self._precompute()
+
+    @classmethod
+    def from_gazetteer(cls, gazetteer):
+        places = {place.id: place for place in gazetteer.places()}
+        keys, place_ids = [], []
+        for key, place_id in gazetteer.names():
+            keys.append(key)
+            place_ids.append(place_id)
+        return cls(keys, place_ids, places)
+
+    def _range(self, prefix):
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + "\uffff")
+
+    def _ranked(self, lo, hi, k):
+        """Positions in keys[lo:hi] with the largest populations, best first"""
+        populations = self.populations[lo:hi]
+        if hi - lo > k:
+            top = np.argpartition(-populations, k)[:k]
+        else:
+            top = np.arange(hi - lo)
+        return lo + top[np.argsort(-populations[top], kind="stable")]
+
+    def _precompute(self):
+        prefixes = {key[:n] for key in self.keys for n in range(1, PRECOMPUTED_PREFIX + 1)}
+        # Over-fetch a little: alternate names of one place collapse into one result
+        return {p: self._ranked(*self._range(p), 3 * PRECOMPUTED_K) for p in prefixes}
+
+    def complete(self, query, k=8):
+        """Top-`k` places whose name (or alternate name) starts with `query`"""
+        prefix = normalize_name(query)
+        if not prefix:
+            return []
+        if len(prefix) <= PRECOMPUTED_PREFIX and k <= PRECOMPUTED_K:
+            positions = self._top.get(prefix, ())
+        else:
+            lo, hi = self._range(prefix)
+            positions = self._ranked(lo, hi, 3 * k)
+
+        results, seen = [], set()
+        for i in positions:
+            place_id = int(self.place_ids[i])
+            if place_id in seen:
+                continue
+            seen.add(place_id)
+            place = self.places[place_id]
+            results.append(Suggestion(place.name, self.keys[i], place.admin2, place.admin1,
+                                      place.country, place.feature_code, place.population,
+                                      place.lat, place.lon))
+            if len(results) == k:
+                break
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_prefix_index():
+    """Shared PrefixIndex built from the gazetteer, or None without a gazetteer"""
+    global _index
+    if _index is not None:
+        return _index
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = PrefixIndex.from_gazetteer(gazetteer)
+    return _index
+
+
+def complete(query, k=8):
+    """Local completions for `query`, [] when there is no index"""
+    index = get_prefix_index()
+    return index.complete(query, k) if index else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Place-name typeahead")
+    parser.add_argument("queries", nargs="+")
+    parser.add_argument("-k", type=int, default=8)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = get_prefix_index()
+    if index is None:
+        parser.error(f"no gazetteer at {GAZETTEER_DB}, build one with gazetteer.py first")
+    print(f"{len(index.keys)} names indexed in {time.perf_counter() - start:.1f}s")
+
+    for query in args.queries:
+        start = time.perf_counter()
+        suggestions = index.complete(query, args.k)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{query!r} ({elapsed:.3f} ms):")
+        for s in suggestions:
+            print(f"  {s.name}, {s.admin1} (population {s.population})")
+
+
+if __name__ == "__main__":
+    main()
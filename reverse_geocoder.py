@@ -0,0 +1,115 @@
+import argparse
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from gazetteer import GAZETTEER_DB, get_gazetteer
+
+EARTH_RADIUS_KM = 6371.0
+# Clicks farther than this from any known place (open sea) have no answer
+MAX_DISTANCE_KM = 100.0
+
+Nearest = namedtuple("Nearest", "name admin2 admin1 country population lat lon distance_km")
+
+
+def to_xyz(lat, lon):
+    """Points on the unit sphere, so Euclidean nearest = great-circle nearest"""
+    lat, lon = np.radians(lat), np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+class ReverseGeocoder:
+    """Nearest gazetteer place for a coordinate, from an in-memory KD-tree
+
+    A query is one tree descent (a few microseconds), no network involved.
+    """
+
+    def __init__(self, places):
+        from scipy.spatial import cKDTree
+
+        self.places = places
+        self.tree = cKDTree(to_xyz(np.array([p.lat for p in places]), np.array([p.lon for p in places])))
+
+    @classmethod
+    def from_gazetteer(cls, gazetteer):
+        """Index the populated places (cities, towns, villages) of the gazetteer"""
+        return cls([p for p in gazetteer.places() if p.feature_code.startswith("PPL")])
+
+    def nearest(self, lat, lon, k=1, max_distance_km=MAX_DISTANCE_KM):
+        """The `k` closest places to (lat, lon), closest first"""
+        # Chord length on the unit sphere for the distance limit
+        max_chord = 2 * np.sin(min(max_distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+        chords, ids = self.tree.query(to_xyz(lat, lon), k=k, distance_upper_bound=max_chord)
+        results = []
+        for chord, i in zip(np.atleast_1d(chords), np.atleast_1d(ids)):
+            if i == len(self.places):
+                break  # fewer than k places within the limit
+            place = self.places[i]
+            distance = 2 * EARTH_RADIUS_KM * np.arcsin(min(chord / 2, 1.0))
+            results.append(Nearest(place.name, place.admin2, place.admin1, place.country,
+                                   place.population, place.lat, place.lon, float(distance)))
+        return results
+
+    def lookup(self, lat, lon, **options):
+        """The closest place to (lat, lon), or None"""
+        results = self.nearest(lat, lon, **options)
+        return results[0] if results else None
+
+
+def describe(nearest):
+    """'Amber, Jaipur, Rajasthan, IN (2.1 km)'"""
+    parts = []
+    for part in (nearest.name, nearest.admin2, nearest.admin1, nearest.country):
+        if part and part not in parts:
+            parts.append(part)
+    return f"{', '.join(parts)} ({nearest.distance_km:.1f} km)"
+
+
+_reverse = None
+_reverse_lock = threading.Lock()
+
+
+def get_reverse_geocoder():
+    """Shared ReverseGeocoder built from the gazetteer, or None without a gazetteer"""
+    global _reverse
+    if _reverse is not None:
+        return _reverse
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return None
+    with _reverse_lock:
+        if _reverse is None:
+            _reverse = ReverseGeocoder.from_gazetteer(gazetteer)
+    return _reverse
+
+
+def reverse_geocode(lat, lon):
+    """Nearest known place to (lat, lon), or None (no gazetteer, or nothing close)"""
+    reverse = get_reverse_geocoder()
+    return reverse.lookup(lat, lon) if reverse else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nearest gazetteer place for coordinates")
+    parser.add_argument("coordinates", nargs="+", help="lat,lon pairs")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    reverse = get_reverse_geocoder()
+    if reverse is None:
+        parser.error(f"no gazetteer at {GAZETTEER_DB}, build one with gazetteer.py first")
+    print(f"{len(reverse.places)} places indexed in {time.perf_counter() - start:.2f}s")
+
+    for pair in args.coordinates:
+        lat, lon = map(float, pair.split(","))
+        start = time.perf_counter()
+        nearest = reverse.lookup(lat, lon)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{pair} ({elapsed:.3f} ms): {describe(nearest) if nearest else 'no place nearby'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# Country outline as GeoJSON, e.g. Natural Earth admin-0 countries or geoBoundaries ADM0
+INDIA_BOUNDARY = os.environ.get("INDIA_BOUNDARY", "data/india_boundary.geojson")
+# Property values that identify India in a file with many countries
+INDIA_CODES = {"IN", "IND"}
+CODE_PROPERTIES = ("ISO_A2", "ISO_A2_EH", "ISO_A3", "ADM0_A3", "shapeGroup", "ISO3166-1")
+# Point chunk for the NumPy containment test, bounds the size of its temporaries
+CHUNK = 4096
+
+
+def decode_polyline(encoded, precision=5):
+    """Google encoded polyline -> (n, 2) array of (lat, lon), without a Python loop"""
+    chunks = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    ends = np.flatnonzero((chunks & 0x20) == 0)
+    if len(ends) < 2:
+        return np.empty((0, 2))
+    ends = ends[:len(ends) // 2 * 2]
+    chunks = chunks[:ends[-1] + 1]
+    # Each value is 5-bit groups, least significant first; the 0x20 bit marks "more follows"
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    value_of = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shifts = 5 * (np.arange(len(chunks)) - starts[value_of])
+    values = np.add.reduceat((chunks & 0x1F) << shifts, starts)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+
+
+def route_bounds(coords, *points):
+    """[[min_lat, min_lon], [max_lat, max_lon]] of a route and any extra points"""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if points:
+        coords = np.concatenate((coords, np.asarray(points, dtype=np.float64).reshape(-1, 2)))
+    return [coords.min(axis=0).tolist(), coords.max(axis=0).tolist()]
+
+
+def read_boundary(path, codes=INDIA_CODES):
+    """Polygons (lists of (lon, lat) rings, outer ring first) of one country from GeoJSON"""
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("type") == "FeatureCollection":
+        features = data["features"]
+        if len(features) > 1:
+            features = [f for f in features
+                        if any(str((f.get("properties") or {}).get(p)) in codes for p in CODE_PROPERTIES)]
+    elif data.get("type") == "Feature":
+        features = [data]
+    else:
+        features = [{"geometry": data}]
+
+    polygons = []
+    for feature in features:
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") == "Polygon":
+            polygons.append(geometry["coordinates"])
+        elif geometry.get("type") == "MultiPolygon":
+            polygons.extend(geometry["coordinates"])
+    if not polygons:
+        raise ValueError(f"No polygon for {sorted(codes)} in {path}")
+    return [[np.asarray(ring, dtype=np.float64)[:, :2] for ring in polygon] for polygon in polygons]
+
+
+class Boundary:
+    """Which points lie inside a country outline, tested for many points at once
+
+    With shapely 2 the outline is a prepared geometry and the test is
+    `shapely.contains_xy`. Without it, an even-odd ray test runs in NumPy;
+    the edges are bucketed into latitude bands so each point is only tested
+    against the edges that can cross its ray. Both reject points outside
+    the bounding box first.
+    """
+
+    def __init__(self, polygons, bands=256):
+        rings = [ring for polygon in polygons for ring in polygon]
+        vertices = np.concatenate(rings)
+        self.min_lon, self.min_lat = vertices.min(axis=0)
+        self.max_lon, self.max_lat = vertices.max(axis=0)
+
+        try:
+            import shapely
+        except ImportError:
+            shapely = None
+        if shapely is not None and hasattr(shapely, "contains_xy"):
+            self.geometry = shapely.MultiPolygon([shapely.Polygon(p[0], p[1:]) for p in polygons])
+            shapely.prepare(self.geometry)
+            return
+        self.geometry = None
+
+        # Every ring edge; closing edges come from the roll (zero length if already closed)
+        x1 = np.concatenate([r[:, 0] for r in rings])
+        y1 = np.concatenate([r[:, 1] for r in rings])
+        x2 = np.concatenate([np.roll(r[:, 0], -1) for r in rings])
+        y2 = np.concatenate([np.roll(r[:, 1], -1) for r in rings])
+        self.edges = np.stack([x1, y1, x2, y2])
+
+        self.bands = bands
+        self.band_height = max(self.max_lat - self.min_lat, 1e-9) / bands
+        first = self._band(np.minimum(y1, y2))
+        last = self._band(np.maximum(y1, y2))
+        counts = last - first + 1
+        edge_ids = np.repeat(np.arange(len(x1)), counts)
+        offsets = np.arange(len(edge_ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+        band_ids = np.repeat(first, counts) + offsets
+        order = np.argsort(band_ids, kind="stable")
+        self.band_edges = edge_ids[order]
+        self.band_ptr = np.concatenate(([0], np.cumsum(np.bincount(band_ids, minlength=bands))))
+
+    def _band(self, lats):
+        return np.clip(((lats - self.min_lat) / self.band_height).astype(np.int64), 0, self.bands - 1)
+
+    def contains(self, lats, lons):
+        """Boolean array: is each (lat, lon) inside the outline"""
+        lats = np.asarray(lats, dtype=np.float64).ravel()
+        lons = np.asarray(lons, dtype=np.float64).ravel()
+        inside = ((lats >= self.min_lat) & (lats <= self.max_lat) &
+                  (lons >= self.min_lon) & (lons <= self.max_lon))
+        candidates = np.flatnonzero(inside)
+        if not len(candidates):
+            return inside
+        if self.geometry is not None:
+            import shapely
+
+            inside[candidates] = shapely.contains_xy(self.geometry, lons[candidates], lats[candidates])
+            return inside
+
+        bands = self._band(lats[candidates])
+        for band in np.unique(bands):
+            edges = self.edges[:, self.band_edges[self.band_ptr[band]:self.band_ptr[band + 1]]]
+            points = candidates[bands == band]
+            for i in range(0, len(points), CHUNK):
+                chunk = points[i:i + CHUNK]
+                inside[chunk] = self._crossings(lats[chunk], lons[chunk], edges) % 2 == 1
+        return inside
+
+    @staticmethod
+    def _crossings(lats, lons, edges):
+        """Edges crossed by a ray from each point towards +lon"""
+        x1, y1, x2, y2 = (e[None, :] for e in edges)
+        py, px = lats[:, None], lons[:, None]
+        straddles = (y1 > py) != (y2 > py)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        return np.count_nonzero(straddles & (px < x), axis=1)
+
+
+_boundary = None
+_boundary_loaded = False
+_boundary_lock = threading.Lock()
+
+
+def get_india_boundary():
+    """Shared Boundary for India, or None when INDIA_BOUNDARY does not exist"""
+    global _boundary, _boundary_loaded
+    if not _boundary_loaded:
+        with _boundary_lock:
+            if not _boundary_loaded:
+                if os.path.exists(INDIA_BOUNDARY):
+                    _boundary = Boundary(read_boundary(INDIA_BOUNDARY))
+                else:
+                    print(f"No India boundary at {INDIA_BOUNDARY}, using the bounding box")
+                _boundary_loaded = True
+    return _boundary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test points against the India boundary")
+    parser.add_argument("coordinates", nargs="+", help="lat,lon pairs")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    boundary = get_india_boundary()
+    if boundary is None:
+        parser.error(f"no boundary at {INDIA_BOUNDARY}")
+    print(f"Boundary loaded in {time.perf_counter() - start:.2f}s "
+          f"({'shapely' if boundary.geometry is not None else 'numpy'})")
+
+    points = np.array([list(map(float, pair.split(","))) for pair in args.coordinates])
+    start = time.perf_counter()
+    inside = boundary.contains(points[:, 0], points[:, 1])
+    elapsed = (time.perf_counter() - start) * 1000
+    for pair, flag in zip(args.coordinates, inside):
+        print(f"{pair}: {'inside' if flag else 'outside'}")
+    print(f"{len(points)} points in {elapsed:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+import argparse
+import threading
+import time
+from collections import deque
+from functools import partial
+from math import gcd
+
+import numpy as np
+import scipy.signal as signal
+import soundfile as sf
+
+from audio_to_text import TARGET_SR, transcribe_audio, text_to_command
+
+# VAD frame length and thresholds
+FRAME_MS = 30
+SPEECH_DB_ABOVE_FLOOR = 12      # frame is speech if this far above the noise floor
+MIN_SPEECH_FRAMES = 3           # consecutive speech frames that open a segment
+END_SILENCE_S = 0.6             # trailing silence that closes a segment
+PAD_S = 0.2                     # audio kept before the detected speech start
+
+# Commands that are decided by a keyword and never change once heard
+CONTROL_COMMANDS = {"satellite", "road layer", "zoom in", "zoom out"}
+
+
+def to_float32(chunk):
+    """Convert a chunk (int16 PCM bytes or a NumPy array) into float32 samples"""
+    if isinstance(chunk, (bytes, bytearray, memoryview)):
+        return np.frombuffer(chunk, dtype="<i2").astype(np.float32) / 32768.0
+    chunk = np.asarray(chunk)
+    if chunk.ndim > 1:
+        chunk = chunk.mean(axis=1)
+    if chunk.dtype == np.int16:
+        return chunk.astype(np.float32) / 32768.0
+    return chunk.astype(np.float32, copy=False)
+
+
+class Utterance:
+    """Command state of one speech segment, only touched by whoever decodes it"""
+
+    def __init__(self):
+        self.last_command = None
+        self.command_repeats = 0
+        self.command_emitted = False
+        self.finished = False
+
+
+class DecodeWorker:
+    """Runs decodes on a background thread so capture never waits for the model
+
+    Partials are latest-only: while the model is busy a newer partial
+    replaces the pending one (older audio is a prefix of it anyway). Finals
+    are queued, never dropped, and go before any pending partial.
+    """
+
+    def __init__(self):
+        self.skipped_partials = 0
+        self._finals = deque()
+        self._partial = None
+        self._busy = False
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, name="stream-decode", daemon=True).start()
+
+    def submit_partial(self, job):
+        with self._cond:
+            if self._partial is not None:
+                self.skipped_partials += 1
+            self._partial = job
+            self._cond.notify_all()
+
+    def submit_final(self, job):
+        with self._cond:
+            self._partial = None  # the final decode covers the same audio
+            self._finals.append(job)
+            self._cond.notify_all()
+
+    def drain(self):
+        """Wait until every submitted final has been decoded"""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._finals and self._partial is None and not self._busy)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._finals or self._partial is not None)
+                if self._finals:
+                    job = self._finals.popleft()
+                else:
+                    job, self._partial = self._partial, None
+                self._busy = True
+            try:
+                job()
+            except Exception as e:
+                print(f"Streaming decode failed: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+
+class StreamingTranscriber:
+    """Segment incoming audio with an energy VAD and transcribe while the user speaks
+
+    Call `feed()` with audio chunks as they arrive. Callbacks:
+      on_partial(text)  - a new partial transcript of the current utterance
+      on_command(cmd)   - the command for the utterance, emitted once, as soon as it is stable
+      on_final(text)    - the full transcript when the utterance ends
+
+    With `background=True` the decodes run on a DecodeWorker and the
+    callbacks are called from its thread; `feed()` then only runs the VAD,
+    so live capture keeps up even when the model is slower than real time.
+    """
+
+    def __init__(self, sr=TARGET_SR, on_partial=None, on_command=None, on_final=None,
+                 partial_interval=1.0, stable_partials=2, background=False):
+        self.sr = sr
+        self.on_partial = on_partial
+        self.on_command = on_command
+        self.on_final = on_final
+        self.partial_interval = partial_interval
+        self.stable_partials = stable_partials
+        self.worker = DecodeWorker() if background else None
+
+        self.frame_len = TARGET_SR * FRAME_MS // 1000
+        self.noise_floor_db = None
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._history = []          # recent frames kept for pre-speech padding
+        self._reset_segment()
+
+    def _reset_segment(self):
+        self.segment = []
+        self.in_speech = False
+        self.speech_run = 0
+        self.silence_run = 0
+        self.samples_since_partial = 0
+        self.utterance = Utterance()
+
+    def _resample(self, y):
+        if self.sr == TARGET_SR:
+            return y
+        g = gcd(self.sr, TARGET_SR)
+        return signal.resample_poly(y, TARGET_SR // g, self.sr // g).astype(np.float32)
+
+    def _is_speech(self, frame):
+        energy_db = 10 * np.log10(np.mean(frame * frame) + 1e-10)
+        if self.noise_floor_db is None:
+            self.noise_floor_db = energy_db
+        is_speech = energy_db > self.noise_floor_db + SPEECH_DB_ABOVE_FLOOR
+        if not is_speech:
+            # Track the noise floor slowly so background changes are followed
+            self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * energy_db
+        return is_speech
+
+    def feed(self, chunk):
+        """Add a chunk of audio recorded at `self.sr`"""
+        y = np.concatenate([self._pending, self._resample(to_float32(chunk))])
+        n_frames = len(y) // self.frame_len
+        self._pending = y[n_frames * self.frame_len:]
+
+        for i in range(n_frames):
+            frame = y[i * self.frame_len:(i + 1) * self.frame_len]
+            self._feed_frame(frame)
+
+    def _feed_frame(self, frame):
+        speech = self._is_speech(frame)
+
+        if not self.in_speech:
+            self._history.append(frame)
+            del self._history[:-int(PAD_S * 1000 / FRAME_MS) - MIN_SPEECH_FRAMES]
+            self.speech_run = self.speech_run + 1 if speech else 0
+            if self.speech_run >= MIN_SPEECH_FRAMES:
+                self.in_speech = True
+                self.segment = list(self._history)
+                self._history = []
+            return
+
+        self.segment.append(frame)
+        self.samples_since_partial += len(frame)
+        self.silence_run = 0 if speech else self.silence_run + 1
+
+        if self.silence_run * FRAME_MS / 1000 >= END_SILENCE_S:
+            self._finish_segment()
+        elif self.samples_since_partial >= self.partial_interval * TARGET_SR:
+            self.samples_since_partial = 0
+            self._partial()
+
+    def _segment_audio(self):
+        y = np.concatenate(self.segment)
+        peak = np.max(np.abs(y))
+        return y / peak if peak > 0 else y
+
+    def _emit_command(self, utterance, command):
+        utterance.command_emitted = True
+        if self.on_command:
+            self.on_command(command)
+
+    def _partial(self):
+        job = partial(self._decode_partial, self.utterance, self._segment_audio())
+        if self.worker:
+            self.worker.submit_partial(job)
+        else:
+            job()
+
+    def _decode_partial(self, utterance, audio):
+        if utterance.finished:
+            return
+        text = transcribe_audio(audio)
+        if self.on_partial:
+            self.on_partial(text)
+        if utterance.command_emitted or not text:
+            return
+
+        command = text_to_command(text)
+        if command == "No valid command":
+            utterance.last_command, utterance.command_repeats = None, 0
+            return
+        if command.lower() in CONTROL_COMMANDS:
+            self._emit_command(utterance, command)
+            return
+
+        # Place names can still grow ("Delhi" -> "Delhi Jaipur"), wait until they settle
+        utterance.command_repeats = utterance.command_repeats + 1 if command == utterance.last_command else 1
+        utterance.last_command = command
+        if utterance.command_repeats >= self.stable_partials:
+            self._emit_command(utterance, command)
+
+    def _finish_segment(self):
+        # Drop most of the trailing silence before the final decode
+        keep = len(self.segment) - self.silence_run + int(PAD_S * 1000 / FRAME_MS)
+        self.segment = self.segment[:max(keep, 1)]
+        job = partial(self._decode_final, self.utterance, self._segment_audio())
+        if self.worker:
+            self.worker.submit_final(job)
+        else:
+            job()
+        self._reset_segment()
+
+    def _decode_final(self, utterance, audio):
+        utterance.finished = True
+        text = transcribe_audio(audio)
+        if self.on_final:
+            self.on_final(text)
+        if not utterance.command_emitted:
+            self._emit_command(utterance, text_to_command(text))
+
+    def flush(self):
+        """Finish the current utterance (e.g. when the stream closes) and wait for its decode"""
+        if self.in_speech and self.segment:
+            self._finish_segment()
+        if self.worker:
+            self.worker.drain()
+
+
+def stream_file(path, chunk_ms=100, realtime=False):
+    """Feed a recording through the streaming transcriber chunk by chunk
+
+    Prints partial results and returns the time from the start of the stream
+    to the first emitted command. With `realtime` the file is fed at
+    recording speed and decoded in the background, like the microphone.
+    """
+    y, sr = sf.read(path, dtype="float32")
+    chunk = sr * chunk_ms // 1000
+    start = time.perf_counter()
+    first_command = {}
+
+    def on_command(command):
+        elapsed = time.perf_counter() - start
+        first_command.setdefault("latency", elapsed)
+        print(f"[{elapsed:6.2f}s] command: {command}")
+
+    transcriber = StreamingTranscriber(
+        sr=sr,
+        on_partial=lambda text: print(f"[{time.perf_counter() - start:6.2f}s] partial: {text}"),
+        on_command=on_command,
+        on_final=lambda text: print(f"[{time.perf_counter() - start:6.2f}s] final: {text}"),
+        background=realtime,
+    )
+    for i in range(0, len(y), chunk):
+        transcriber.feed(y[i:i + chunk])
+        if realtime:
+            time.sleep(chunk_ms / 1000)
+    transcriber.flush()
+    return first_command.get("latency")
+
+
+def stream_microphone(chunk_ms=100, sr=TARGET_SR):
+    """Transcribe live microphone input until interrupted (needs sounddevice)"""
+    import sounddevice as sd
+
+    transcriber = StreamingTranscriber(
+        sr=sr,
+        on_partial=lambda text: print("partial:", text),
+        on_command=lambda command: print("command:", command),
+        on_final=lambda text: print("final:", text),
+        background=True,
+    )
+    overflows = 0
+    with sd.InputStream(samplerate=sr, channels=1, dtype="float32") as stream:
+        print("Listening... press Ctrl+C to stop")
+        try:
+            while True:
+                data, overflowed = stream.read(sr * chunk_ms // 1000)
+                if overflowed:
+                    # The device buffer filled up before this read: audio was lost
+                    overflows += 1
+                    print(f"Input overflow, audio dropped ({overflows} so far)")
+                transcriber.feed(data)
+        except KeyboardInterrupt:
+            transcriber.flush()
+    print(f"Input overflows: {overflows}, partial decodes skipped: {transcriber.worker.skipped_partials}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming voice command recognition")
+    parser.add_argument("path", nargs="?", help="WAV file to stream (omit to use the microphone)")
+    parser.add_argument("--chunk-ms", type=int, default=100)
+    parser.add_argument("--realtime", action="store_true", help="feed the file at recording speed")
+    args = parser.parse_args()
+
+    if args.path:
+        latency = stream_file(args.path, args.chunk_ms, args.realtime)
+        if latency is not None:
+            print(f"Time to first command: {latency:.2f}s")
+    else:
+        stream_microphone(args.chunk_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import pytest
+
+from asr_bias import HIGHWAY_REGEX, _highway, correct_transcript, snap_commands
+from command_grammar import match_command
+from place_matcher import PlaceMatcher
+
+PLACES = {"delhi": 16_000_000, "mumbai": 12_000_000, "bengaluru": 8_000_000, "agra": 1_500_000}
+
+
+@pytest.fixture
+def matcher():
+    return PlaceMatcher(list(PLACES), list(PLACES.values()),
+                        [name.title() for name in PLACES])
+
+
+def highway(text):
+    return HIGHWAY_REGEX.sub(_highway, text)
+
+
+@pytest.mark.parametrize("text", [
+    "Zoom on Delhi",
+    "Room in Delhi",
+    "room in Mumbai please",
+    "show the shrine in Amritsar",
+    "a serial killer",
+    "take the streets to Agra",
+    "via the highway one more time",
+])
+def test_ordinary_words_are_not_commands(text, matcher):
+    assert correct_transcript(text, matcher) == text
+
+
+@pytest.mark.parametrize("text", ["Zoom on Delhi", "Room in Delhi"])
+def test_place_clause_keeps_the_place(text, matcher):
+    assert match_command(correct_transcript(text, matcher)) is None
+
+
+@pytest.mark.parametrize("heard, expected", [
+    ("zooom in", "zoom in"),
+    ("stret map please", "street map please"),
+    ("switch to satelite view", "switch to satellite view"),
+])
+def test_near_miss_commands_are_snapped(heard, expected):
+    assert snap_commands(heard) == expected
+
+
+@pytest.mark.parametrize("heard, expected", [
+    ("national highway forty four", "NH44"),
+    ("national highway four four", "NH44"),
+    ("n h 48", "NH48"),
+    ("N.H.-27", "NH27"),
+    ("national highway one hundred and six", "NH106"),
+    ("national highway forty four one more time", "NH44 one more time"),
+    ("national highway forty-four to Agra", "NH44 to Agra"),
+])
+def test_highway_numbers(heard, expected):
+    assert highway(heard) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "national highway hundred",
+    "nh hundred",
+    "national highway zero",
+    "nh 0",
+    "take the highway one more time",
+])
+def test_not_highway_numbers(text):
+    assert highway(text) == text
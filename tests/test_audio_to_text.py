@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+audio_to_text = pytest.importorskip("audio_to_text")
+
+SR = 16000
+
+
+def clip(speech_dbfs, noise_dbfs, seconds=3, seed=0):
+    """A 220 Hz tone at `speech_dbfs` in the middle second, over white noise"""
+    rng = np.random.default_rng(seed)
+    y = rng.normal(0, 10 ** (noise_dbfs / 20), seconds * SR)
+    t = np.arange(SR, 2 * SR)
+    y[SR:2 * SR] += np.sqrt(2) * 10 ** (speech_dbfs / 20) * np.sin(2 * np.pi * 220 * t / SR)
+    return y.astype(np.float32)
+
+
+@pytest.mark.parametrize("speech_dbfs, noise_dbfs", [(-20, -60), (-53, -80)])
+def test_speech_region_keeps_quiet_speech(speech_dbfs, noise_dbfs):
+    start, end = audio_to_text.speech_region(clip(speech_dbfs, noise_dbfs), SR)
+    assert start <= SR and end >= 2 * SR
+    assert end - start < 1.5 * SR
+
+
+@pytest.mark.parametrize("y", [
+    np.zeros(3 * SR, dtype=np.float32),
+    np.random.default_rng(0).normal(0, 0.01, 3 * SR).astype(np.float32),
+    np.random.default_rng(0).uniform(-1e-4, 1e-4, 3 * SR).astype(np.float32),
+], ids=["silence", "room noise", "dither"])
+def test_speech_region_noise_only_is_empty(y):
+    assert audio_to_text.speech_region(y, SR) is None
@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip("geopy")
+
+import geocoding
+from gazetteer import Place, normalize_name
+
+
+def place(name, country, lat, lon):
+    return Place(1, name, "", "", country, "PPL", 100000, lat, lon)
+
+
+class FakeGazetteer:
+    def __init__(self, places):
+        self.places = places
+
+    def lookup(self, name, limit=5):
+        return self.places.get(normalize_name(name), [])[:limit]
+
+
+@pytest.fixture
+def geocoder(monkeypatch):
+    gazetteer = FakeGazetteer({
+        "hyderabad": [place("Hyderabad", "PK", 25.4, 68.4), place("Hyderabad", "IN", 17.4, 78.5)],
+        "karachi": [place("Karachi", "PK", 24.9, 67.0)],
+        "agra": [place("Agra", "", 27.2, 78.0)],
+    })
+    monkeypatch.setattr(geocoding, "get_gazetteer", lambda: gazetteer)
+    geocoder = geocoding.Geocoder(disk_path=None)
+    monkeypatch.setattr(geocoder, "_single_flight", lambda key, name: "next tier")
+    return geocoder
+
+
+def test_gazetteer_skips_places_abroad(geocoder):
+    assert geocoder.geocode("Hyderabad") == (17.4, 78.5)
+    assert geocoder.geocode("Karachi") == "next tier"
+
+
+def test_gazetteer_accepts_places_without_country(geocoder):
+    assert geocoder.geocode("Agra") == (27.2, 78.0)
@@ -0,0 +1,45 @@
+import pytest
+
+from place_matcher import PlaceMatcher
+
+PLACES = {
+    "delhi": 16_000_000, "mumbai": 12_000_000, "navi mumbai": 1_100_000, "bengaluru": 8_000_000,
+    "agra": 1_500_000, "thane": 1_800_000, "latur": 380_000, "hosur": 250_000, "puri": 200_000,
+    "pali": 230_000, "moga": 160_000, "kota": 1_000_000, "salem": 900_000, "erode": 500_000,
+    "bally": 290_000, "rewa": 235_000, "tonk": 165_000, "mau": 280_000, "guna": 180_000,
+}
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return PlaceMatcher(list(PLACES), list(PLACES.values()), [name.title() for name in PLACES])
+
+
+@pytest.mark.parametrize("text", [
+    "show me the way later",
+    "zoom in for an hour",
+    "take me somewhere pure",
+    "switch to satellite view",
+    "zoom out a bit more please",
+    "show the street map",
+    "give me the aerial view",
+    "shrink the map a little",
+    "show traffic on the main road",
+    "go back to the previous view",
+    "where am i right now",
+])
+def test_commands_name_no_places(matcher, text):
+    assert matcher.resolve(text, []) == []
+
+
+@pytest.mark.parametrize("text, places", [
+    ("route from bangaluru to agra", ["Bengaluru", "Agra"]),
+    ("from navi mumbay to thane", ["Navi Mumbai", "Thane"]),
+    ("show me delhi", ["Delhi"]),
+])
+def test_scan_finds_places(matcher, text, places):
+    assert matcher.resolve(text, []) == places
+
+
+def test_lookup_accepts_non_ascii(matcher):
+    assert matcher.best("delhø").label == "Delhi"
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def audio_key(y, sr, version):
+    """Content hash of decoded audio plus the model/config version that produced the result"""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(version.encode())
+    h.update(str(sr).encode())
+    h.update(y.tobytes())
+    return h.hexdigest()
+
+
+class TranscriptCache:
+    """In-memory LRU of pipeline results with an optional on-disk tier
+
+    Values are JSON-serializable dicts (transcript, command, entities...).
+    The disk tier stores one small JSON file per key under `directory`, so it
+    can be shared by Streamlit workers and batch runs on the same machine.
+    """
+
+    def __init__(self, max_entries=256, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached value for `key` or None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.directory:
+            try:
+                with open(self._path(key)) as f:
+                    value = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                value = None
+            if value is not None:
+                with self._lock:
+                    self._remember(key, value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """Store `value` in memory and, if configured, on disk"""
+        with self._lock:
+            self._remember(key, value)
+
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+
+    def clear(self):
+        """Drop the in-memory entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }